@@ -0,0 +1,81 @@
+"""
+Benchmark of the worker aggregation in SBICryptoData.update
+
+Builds synthetic /account and /workers payloads and times WorkerAggregator,
+fed one worker at a time with add and closed with result as the streamed
+refresh does, for growing fleets spread over a fixed number of subaccounts.
+With a single group-by pass the time per worker stays flat as the fleet
+grows.
+
+    python benchmarks/bench_aggregate.py [--accounts 100] [--workers 50000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool import WorkerAggregator
+
+STATES = [ "ONLINE", "ONLINE", "ONLINE", "OFFLINE", "DEAD", "" ]
+
+
+def make_payloads(num_accounts, num_workers, seed=0):
+    rnd = random.Random(seed)
+
+    accounts = [
+        { "subaccountName": f"account{i}", "currentMiningCurrency": { "code": "BTC" } }
+        for i in range(num_accounts)
+    ]
+    workers = [
+        {
+            "name": f"{i}",
+            "state": rnd.choice(STATES),
+            "lastShareTime": "2022-01-01T00:00:00+00:00",
+            "subaccountId": i % num_accounts,
+            "subaccount": f"account{i % num_accounts}",
+            "hashrates": [ rnd.uniform(50, 110), rnd.uniform(50, 110), rnd.uniform(50, 110) ],
+            "coinId": 1,
+        }
+        for i in range(num_workers)
+    ]
+    return accounts, workers
+
+
+def aggregate(accounts, workers):
+    aggregator = WorkerAggregator()
+    for worker in workers:
+        aggregator.add(worker)
+    return aggregator.result(accounts)
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'workers':>10} {'total, ms':>12} {'per worker, us':>16}")
+
+    for fraction in (8, 4, 2, 1):
+        num_workers = args.workers // fraction
+        accounts, workers = make_payloads(args.accounts, num_workers)
+
+        elapsed = best_of(lambda: aggregate(accounts, workers), args.repeat)
+        print(f"{num_workers:>10} {elapsed * 1000:>12.1f} {elapsed / num_workers * 1000000:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
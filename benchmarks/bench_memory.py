@@ -0,0 +1,62 @@
+"""
+Per-worker memory of the aggregated mining data
+
+Compares the per-worker dicts the integration used to keep (a copy of the
+/workers record with the hashrates converted to H/s) with SBICryptoWorker
+records, measured with tracemalloc after aggregating a synthetic fleet.
+
+    python benchmarks/bench_memory.py [--accounts 100] [--workers 50000]
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool import SBICryptoWorker
+
+from bench_aggregate import make_payloads
+
+
+def as_dicts(workers):
+    records = []
+    for worker in workers:
+        record = { key: value for key, value in worker.items() if key != "coinId" }
+        record["hashrates"] = [ round(hr * 1000000) for hr in worker["hashrates"] ]
+        records.append(record)
+    return records
+
+
+def as_records(workers):
+    return [ SBICryptoWorker.from_api(worker) for worker in workers ]
+
+
+def measure(build, workers):
+    gc.collect()
+    tracemalloc.start()
+    result = build(workers)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=50000)
+    args = parser.parse_args()
+
+    _, workers = make_payloads(args.accounts, args.workers)
+
+    print(f"{'layout':>16} {'total, MiB':>12} {'per worker, B':>15}")
+
+    for title, build in (("dict", as_dicts), ("SBICryptoWorker", as_records)):
+        size = measure(build, workers)
+        print(f"{title:>16} {size / 1048576:>12.1f} {size / args.workers:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+End to end refresh benchmark against a local stand-in pool API
+
+Starts pool_server.py in a child process and, for a number of refresh
+cycles, drives:
+  - client: the blocking SBICryptoPoolClient (get_account + get_workers),
+  - update: SBICryptoData.async_update on an aiohttp session,
+  - sensors: the same update followed by the sensor fan-out, with one
+    worker sensor per worker and one status sensor per account (state
+    writes are counted, there is no Home Assistant instance behind them).
+For each it reports the wall time and CPU time per cycle, the requests
+per cycle and, from one extra traced cycle, the peak traced memory. With
+--shards N the update and sensors paths refresh one of N shards per cycle,
+like the sharded refresh does, downloading the lists every N cycles.
+
+    python benchmarks/bench_refresh.py [--workers 10000] [--cycles 5] [--latency 0.05] [--error-rate 0.01] [--etag] [--shards 4]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool import (
+    SBICryptoAPIException, SBICryptoData, SBICryptoPoolClient, SBICryptoRequestException
+)
+from custom_components.sbicrypto_pool.sensor import SBICryptoStatusSensor, SBICryptoWorkerSensor
+from custom_components.sbicrypto_pool.shards import ShardPlan
+
+from pool_server import API_PATH, DEFAULT_STATES, parse_states, start_in_process
+
+
+class Cycle:
+    """Wall and CPU time of one refresh cycle."""
+
+    def __init__(self):
+        self.wall = []
+        self.cpu = []
+        self.failures = 0
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.wall.append(time.perf_counter() - self._wall)
+        self.cpu.append(time.process_time() - self._cpu)
+        if isinstance(exc, (SBICryptoAPIException, SBICryptoRequestException)):
+            self.failures += 1
+            return True
+
+
+async def served(session, base):
+    async with session.get(f"{base}/stats") as response:
+        stats = await response.json()
+    return stats["account"] + stats["workers"]
+
+
+def make_sensors(sbicrypto_data, writes):
+    """Worker and status sensors wired to a bare coordinator, as async_setup_platform would create them."""
+    coordinator = SimpleNamespace(sbicrypto_data=sbicrypto_data, last_update_success=True)
+
+    def count_write():
+        writes[0] += 1
+
+    sensors = [ SBICryptoWorkerSensor(coordinator, "bench", worker) for worker in sbicrypto_data.workers_index.values() ]
+    sensors += [
+        SBICryptoStatusSensor(
+            coordinator, "bench", status["name"], status["coin"], status["workerStatus"],
+            status["numOfWorkers"], status["hashrate"], 0, status.get("statistics")
+        )
+        for status in sbicrypto_data.accounts_index.values()
+    ]
+    for sensor in sensors:
+        sensor.async_write_ha_state = count_write
+        sensor._available = True
+    return sensors
+
+
+async def run(args):
+    base = f"http://127.0.0.1:{args.port}"
+    api_url = base + API_PATH
+    results = {}
+
+    async with aiohttp.ClientSession() as session:
+        # blocking client, in a worker thread like Home Assistant would run it
+        client = SBICryptoPoolClient("bench", "bench")
+        client.API_URL = api_url
+        loop = asyncio.get_running_loop()
+
+        def fetch():
+            client.get_account()
+            client.get_workers()
+
+        results["client"] = await measure(args, session, base, lambda: loop.run_in_executor(None, fetch))
+
+        # SBICryptoData on the shared aiohttp session
+        sbicrypto_data = SBICryptoData([ { "api_key": "bench", "api_secret": "bench" } ], session, shards=ShardPlan(args.shards))
+        for item, _ in sbicrypto_data.clients:
+            item.API_URL = api_url
+
+        results["update"] = await measure(args, session, base, sbicrypto_data.async_update)
+
+        # the same, plus the sensor fan-out
+        writes = [ 0 ]
+        sensors = make_sensors(sbicrypto_data, writes)
+
+        async def refresh_and_notify():
+            await sbicrypto_data.async_update()
+            for sensor in sensors:
+                sensor._handle_coordinator_update()
+
+        results["sensors"] = await measure(args, session, base, refresh_and_notify)
+        results["sensors"]["writes"] = writes[0] / (args.cycles + 1)
+
+    return results
+
+
+async def measure(args, session, base, refresh):
+    cycle = Cycle()
+    before = await served(session, base)
+
+    for _ in range(args.cycles):
+        with cycle:
+            await refresh()
+
+    requests = (await served(session, base) - before) / args.cycles
+
+    tracemalloc.start()
+    with Cycle():
+        await refresh()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "wall": statistics.median(cycle.wall),
+        "wall_max": max(cycle.wall),
+        "cpu": statistics.median(cycle.cpu),
+        "requests": requests,
+        "peak": peak,
+        "failures": cycle.failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=10000)
+    parser.add_argument("--states", type=parse_states, default=DEFAULT_STATES)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--churn", type=float, default=0.05)
+    parser.add_argument("--etag", action="store_true")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    server = start_in_process(
+        args.port, accounts=args.accounts, workers=args.workers, states=args.states, latency=args.latency,
+        jitter=args.jitter, error_rate=args.error_rate, churn_share=args.churn, etag=args.etag
+    )
+    try:
+        results = asyncio.run(run(args))
+    finally:
+        server.terminate()
+
+    print(f"{args.workers} workers in {args.accounts} accounts, {args.cycles} cycles")
+    print(f"{'path':>8} {'wall, ms':>10} {'max, ms':>10} {'cpu, ms':>10} {'requests':>9} {'peak, MiB':>10} {'failed':>7} {'writes':>8}")
+    for name, result in results.items():
+        print(
+            f"{name:>8} {result['wall'] * 1000:>10.1f} {result['wall_max'] * 1000:>10.1f} {result['cpu'] * 1000:>10.1f} "
+            f"{result['requests']:>9.1f} {result['peak'] / 1048576:>10.1f} {result['failures']:>7} "
+            f"{result.get('writes', 0):>8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
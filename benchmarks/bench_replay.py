@@ -0,0 +1,57 @@
+"""
+Replay of recorded pool API responses through SBICryptoData
+
+Feeds the captures written with the record_responses option (or with
+capture.ResponseRecorder) back to SBICryptoData.async_update, with the
+recorded latencies multiplied by --scale, and reports the wall and CPU
+time of every refresh. Run it under cProfile to profile a production
+fleet offline:
+
+    python benchmarks/bench_replay.py /config/sbicrypto_captures [--prefix key1] [--scale 0] [--cycles 5]
+    python -m cProfile -s cumtime benchmarks/bench_replay.py /config/sbicrypto_captures --scale 0
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool import SBICryptoData
+from custom_components.sbicrypto_pool.capture import ReplaySession
+
+
+async def run(args):
+    session = ReplaySession(args.directory, args.prefix, args.scale)
+    sbicrypto_data = SBICryptoData([ { "api_key": "replay", "api_secret": "replay" } ], session)
+
+    print(f"{'cycle':>6} {'wall, ms':>10} {'cpu, ms':>10} {'workers':>9} {'changes':>8}")
+
+    for cycle in range(args.cycles):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        await sbicrypto_data.async_update()
+        wall = time.perf_counter() - wall
+        cpu = time.process_time() - cpu
+        print(
+            f"{cycle + 1:>6} {wall * 1000:>10.1f} {cpu * 1000:>10.1f} "
+            f"{len(sbicrypto_data.workers_index):>9} {sbicrypto_data.state_changes:>8}"
+        )
+
+    print(f"{session.requests} requests replayed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("directory")
+    parser.add_argument("--prefix", default="key1", help="captures of which API key to replay")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier of the recorded latencies, 0 for none")
+    parser.add_argument("--cycles", type=int, default=5)
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark of the per-account hashrate statistics
+
+Times the vectorized NumPy engine in stats.account_statistics against the
+plain Python fallback, next to the element by element loop that summed the
+hashrates and counted the states of every worker before the statistics
+existed (and yields only sums, means and state counts), for 1k to 100k
+workers spread over the subaccounts. The smallest fleets show where
+stats.NUMPY_MIN_WORKERS belongs.
+
+    python benchmarks/bench_statistics.py [--accounts 100] [--workers 1000 10000 100000]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool import WORKER_STATES, aggregate_workers
+from custom_components.sbicrypto_pool import stats
+
+from bench_aggregate import best_of, make_payloads
+
+
+def loop_statistics(groups):
+    """The per-worker loop the account totals used to come from."""
+    result = {}
+    for name, workers in groups.items():
+        counts = { "OFFLINE": 0, "DEAD": 0, "ONLINE": 0, "UNKNOWN": 0 }
+        total = [ 0, 0, 0 ]
+        for worker in workers:
+            state = WORKER_STATES.get(worker.state)
+            if state is not None:
+                counts[state] += 1
+            total[0] += worker.hrate10m
+            total[1] += worker.hrate1h
+            total[2] += worker.hrate24h
+        if workers:
+            result[name] = { "sum": total, "mean": [ value / len(workers) for value in total ], "states": counts }
+    return result
+
+
+def python_statistics(groups):
+    return { name: stats._python_statistics(workers) for name, workers in groups.items() if workers }
+
+
+def numpy_statistics(groups):
+    return stats._numpy_statistics({ name: workers for name, workers in groups.items() if workers })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, nargs="+", default=[ 1000, 10000, 100000 ])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if stats.np is None:
+        sys.exit("NumPy is not installed")
+
+    print(f"{'workers':>10} {'loop, ms':>12} {'python, ms':>12} {'numpy, ms':>12}")
+
+    for num_workers in args.workers:
+        accounts, workers = make_payloads(args.accounts, num_workers)
+        groups = { accName: type.get("workers", []) for accName, type in aggregate_workers(accounts, workers).items() }
+
+        loop = best_of(lambda: loop_statistics(groups), args.repeat)
+        python = best_of(lambda: python_statistics(groups), args.repeat)
+        vectorized = best_of(lambda: numpy_statistics(groups), args.repeat)
+        print(f"{num_workers:>10} {loop * 1000:>12.1f} {python * 1000:>12.1f} {vectorized * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Local stand-in for the SBICrypto pool API
+
+Serves synthetic /api/external/v1/account and /workers responses for a
+fleet of configurable size and state mix, with an artificial latency and
+a share of failing requests. The fleet comes in a few precomputed
+snapshots, served in turn, in which a part of the workers changed their
+hashrate or state, so consecutive refreshes see realistic churn.
+
+    python benchmarks/pool_server.py [--port 8080] [--workers 10000] [--latency 0.05]
+
+With --etag the responses carry an ETag and conditional requests are
+answered with 304 Not Modified. GET /stats returns the number of requests
+served per endpoint.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import random
+from typing import Dict, Optional
+
+from aiohttp import web
+
+API_PATH = "/api/external/v1"
+
+DEFAULT_STATES = { "ONLINE": 0.85, "OFFLINE": 0.08, "DEAD": 0.05, "": 0.02 }
+
+
+def parse_states(value: str) -> Dict[str, float]:
+    """Parse a state mix given as ONLINE=0.8,OFFLINE=0.1,DEAD=0.1 (UNKNOWN for the empty state)."""
+    states = {}
+    for item in value.split(","):
+        state, _, weight = item.partition("=")
+        state = state.strip().upper()
+        states["" if state == "UNKNOWN" else state] = float(weight)
+    return states
+
+
+def make_fleet(accounts: int, workers: int, states: Dict[str, float], seed: int = 0):
+    """Account list and worker records of a synthetic fleet."""
+    rnd = random.Random(seed)
+    names = list(states)
+    weights = [ states[name] for name in names ]
+
+    subaccounts = [
+        { "subaccountName": f"account{i}", "currentMiningCurrency": { "code": "BTC" if i % 4 else "LTC" } }
+        for i in range(accounts)
+    ]
+    fleet = []
+    for i in range(workers):
+        state = rnd.choices(names, weights)[0]
+        base = rnd.uniform(50, 110) if state == "ONLINE" else 0
+        fleet.append({
+            "name": f"rig{i:06d}",
+            "state": state,
+            "lastShareTime": "2024-01-01T00:00:00+00:00",
+            "subaccountId": i % accounts,
+            "subaccount": f"account{i % accounts}",
+            "hashrates": [ round(base * rnd.uniform(0.9, 1.1), 3), round(base, 3), round(base, 3) ],
+            "coinId": 1,
+        })
+    return subaccounts, fleet
+
+
+def churn(fleet, states: Dict[str, float], share: float, rnd: random.Random):
+    """Copy of the fleet in which `share` of the workers moved."""
+    names = list(states)
+    weights = [ states[name] for name in names ]
+    fleet = [ dict(worker) for worker in fleet ]
+
+    for worker in rnd.sample(fleet, int(len(fleet) * share)):
+        if rnd.random() < 0.1:
+            worker["state"] = rnd.choices(names, weights)[0]
+        rate = worker["hashrates"][1] if worker["state"] == "ONLINE" else 0
+        worker["hashrates"] = [ round(rate * rnd.uniform(0.8, 1.1), 3) ] + worker["hashrates"][1:]
+    return fleet
+
+
+class PoolServer:
+    def __init__(
+            self, accounts: int = 100, workers: int = 10000, states: Optional[Dict[str, float]] = None,
+            latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, churn_share: float = 0.05,
+            snapshots: int = 4, seed: int = 0, etag: bool = False
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etag = etag
+        self.requests = { "account": 0, "workers": 0, "errors": 0, "not_modified": 0 }
+        self._rnd = random.Random(seed)
+
+        states = states or DEFAULT_STATES
+        subaccounts, fleet = make_fleet(accounts, workers, states, seed)
+        self._account = json.dumps({ "content": { "subaccounts": subaccounts } }).encode()
+        self._workers = []
+        for _ in range(max(1, snapshots)):
+            self._workers.append(json.dumps({ "content": fleet }).encode())
+            fleet = churn(fleet, states, churn_share, self._rnd)
+        self._served = 0
+
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(f"{API_PATH}/account", self.account)
+        app.router.add_get(f"{API_PATH}/workers", self.workers)
+        app.router.add_get("/stats", self.stats)
+        return app
+
+
+    async def _delay(self):
+        delay = self.latency + self.jitter * self._rnd.random()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and self._rnd.random() < self.error_rate:
+            self.requests["errors"] += 1
+            raise web.HTTPServiceUnavailable(
+                text=json.dumps({ "error": "unavailable", "error_description": "Simulated failure" }),
+                content_type="application/json"
+            )
+
+
+    def _respond(self, request, body: bytes) -> web.Response:
+        if not self.etag:
+            return web.Response(body=body, content_type="application/json")
+
+        etag = '"{}"'.format(hashlib.blake2b(body, digest_size=8).hexdigest())
+        if request.headers.get("If-None-Match") == etag:
+            self.requests["not_modified"] += 1
+            return web.Response(status=304, headers={ "ETag": etag })
+        return web.Response(body=body, content_type="application/json", headers={ "ETag": etag })
+
+
+    async def account(self, request):
+        self.requests["account"] += 1
+        await self._delay()
+        return self._respond(request, self._account)
+
+
+    async def workers(self, request):
+        self.requests["workers"] += 1
+        await self._delay()
+        body = self._workers[self._served % len(self._workers)]
+        self._served += 1
+        return self._respond(request, body)
+
+
+    async def stats(self, request):
+        return web.json_response(self.requests)
+
+
+def _serve(port: int, options: Dict, ready):
+    async def main():
+        runner = web.AppRunner(PoolServer(**options).app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", port)
+        await site.start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+def start_in_process(port: int, **options) -> multiprocessing.Process:
+    """Run the server in a child process, so it does not count toward the measured CPU time."""
+    ready = multiprocessing.Event()
+    process = multiprocessing.Process(target=_serve, args=(port, options, ready), daemon=True)
+    process.start()
+    if not ready.wait(120):
+        process.terminate()
+        raise RuntimeError("The stand-in pool API did not start")
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--accounts", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=10000)
+    parser.add_argument("--states", type=parse_states, default=DEFAULT_STATES)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--churn", type=float, default=0.05, help="share of workers changing between snapshots")
+    parser.add_argument("--etag", action="store_true", help="send ETags and honor If-None-Match")
+    args = parser.parse_args()
+
+    server = PoolServer(
+        args.accounts, args.workers, args.states, args.latency, args.jitter, args.error_rate, args.churn, etag=args.etag
+    )
+    web.run_app(server.app(), host="127.0.0.1", port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,44 @@
-from typing import Dict, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Tuple
 
 import json
 import aiohttp
 import asyncio
 import hashlib
-import hmac
 import requests
+import sqlite3
 import time
-from operator import itemgetter
-from urllib.parse import urlencode
-from datetime import timedelta
+from sys import intern
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 import logging
 
 import voluptuous as vol
 
-from homeassistant.const import CONF_API_KEY, CONF_NAME
+from homeassistant.const import CONF_API_KEY, CONF_NAME, CONF_SCAN_INTERVAL, EVENT_HOMEASSISTANT_STOP
+from homeassistant.core import callback
+try:
+    from homeassistant.core import SupportsResponse
+except ImportError:
+    # before 2023.7 services could not answer
+    SupportsResponse = None
+from homeassistant.exceptions import HomeAssistantError
 import homeassistant.helpers.config_validation as cv
-from homeassistant.helpers.discovery import load_platform
-from homeassistant.util import Throttle
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.discovery import async_load_platform
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .capture import ResponseRecorder
+from .earnings import EarningsStore, EarningsSync
+from .history import HashrateHistory
+from .metrics import Metrics
+from .profiling import ProfilerBusyError, async_profile
+from .resilience import CircuitBreaker, CircuitOpenError, RetryPolicy
+from .scheduler import AdaptiveInterval
+from .shards import ShardPlan
+from .stats import account_statistics
+from .stream import iter_json_items
+from .views import SBICryptoMetricsView
 
 __version__ = "1.0.2"
 
@@ -26,146 +47,851 @@ DOMAIN = "sbicrypto_pool"
 DEFAULT_NAME = "SBICrypto"
 CONF_API_SECRET = "api_secret"
 CONF_MINING = "miners"
+CONF_ACCOUNTS = "accounts"
+CONF_HASHRATE_DEADBAND = "hashrate_deadband"
+CONF_FAST_SCAN_INTERVAL = "fast_scan_interval"
+CONF_MAX_BACKOFF = "max_backoff"
+CONF_ROLLUP = "rollup"
+CONF_ROLLUP_TOP = "rollup_top"
+CONF_WORKERS = "workers"
+CONF_HISTORY_SIZE = "history_size"
+CONF_HASHRATE_DROP = "hashrate_drop"
+CONF_RECORD_RESPONSES = "record_responses"
+CONF_EARNINGS = "earnings"
+CONF_EARNINGS_INTERVAL = "earnings_interval"
+CONF_SHARDS = "shards"
 
-SCAN_INTERVAL = timedelta(minutes=1)
-MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=5)
+DEFAULT_SCAN_INTERVAL = timedelta(minutes=5)
+DEFAULT_FAST_SCAN_INTERVAL = timedelta(minutes=1)
+DEFAULT_MAX_BACKOFF = timedelta(minutes=30)
+DEFAULT_EARNINGS_INTERVAL = timedelta(minutes=30)
 
 DATA_SBICRYPTO = "sbicrypto_pool_cache"
 
+STORAGE_KEY = f"{DOMAIN}.snapshot"
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30
+
+EARNINGS_DATABASE = f"{DOMAIN}.earnings.db"
+
+EVENT_HASHRATE_DROP = f"{DOMAIN}_hashrate_drop"
+
+SERVICE_PROFILE = "profile"
+ATTR_TOP = "top"
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_TOP, default=25): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=500)
+        ),
+    }
+)
+
 _LOGGER = logging.getLogger(__name__)
 
+CREDENTIALS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_API_KEY): cv.string,
+        vol.Required(CONF_API_SECRET): cv.string,
+        vol.Optional(CONF_MINING, default=[]): vol.All(
+            cv.ensure_list, [cv.string]
+        ),                
+    }
+)
+
+def has_credentials(conf: Dict) -> Dict:
+    """Require the api_key/api_secret pair or at least one entry in accounts."""
+    if CONF_API_KEY not in conf and not conf.get(CONF_ACCOUNTS):
+        raise vol.Invalid(f"Either {CONF_API_KEY} and {CONF_API_SECRET}, or at least one entry in {CONF_ACCOUNTS} is required")
+    return conf
+
+
 CONFIG_SCHEMA = vol.Schema(
     {
-        DOMAIN: vol.Schema(
+        DOMAIN: vol.All(vol.Schema(
             {
                 vol.Optional(CONF_NAME, default=DEFAULT_NAME): cv.string,
-                vol.Required(CONF_API_KEY): cv.string,
-                vol.Required(CONF_API_SECRET): cv.string,
-                vol.Required(CONF_MINING): vol.All(
+                vol.Inclusive(CONF_API_KEY, "credentials"): cv.string,
+                vol.Inclusive(CONF_API_SECRET, "credentials"): cv.string,
+                vol.Optional(CONF_MINING, default=[]): vol.All(
                     cv.ensure_list, [cv.string]
                 ),                
+                vol.Optional(CONF_ACCOUNTS, default=[]): vol.All(
+                    cv.ensure_list, [CREDENTIALS_SCHEMA]
+                ),
+                vol.Optional(CONF_HASHRATE_DEADBAND, default=0): vol.All(
+                    vol.Coerce(float), vol.Range(min=0, max=1)
+                ),
+                vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): cv.time_period,
+                vol.Optional(CONF_FAST_SCAN_INTERVAL, default=DEFAULT_FAST_SCAN_INTERVAL): cv.time_period,
+                vol.Optional(CONF_MAX_BACKOFF, default=DEFAULT_MAX_BACKOFF): cv.time_period,
+                vol.Optional(CONF_ROLLUP, default=False): cv.boolean,
+                vol.Optional(CONF_ROLLUP_TOP, default=5): cv.positive_int,
+                vol.Optional(CONF_WORKERS, default=[]): vol.All(
+                    cv.ensure_list, [cv.string]
+                ),
+                vol.Optional(CONF_HISTORY_SIZE, default=24): vol.All(
+                    vol.Coerce(int), vol.Range(min=0, max=1440)
+                ),
+                vol.Optional(CONF_HASHRATE_DROP, default=0.2): vol.All(
+                    vol.Coerce(float), vol.Range(min=0, max=1)
+                ),
+                vol.Optional(CONF_RECORD_RESPONSES): cv.string,
+                vol.Optional(CONF_EARNINGS, default=False): cv.boolean,
+                vol.Optional(CONF_EARNINGS_INTERVAL, default=DEFAULT_EARNINGS_INTERVAL): cv.time_period,
+                vol.Optional(CONF_SHARDS, default=1): vol.All(
+                    vol.Coerce(int), vol.Range(min=1, max=60)
+                ),
             }
-        )
+        ), has_credentials)
     },
     extra=vol.ALLOW_EXTRA,
 )
 
 
-def setup(hass, config):
-    api_key = config[DOMAIN][CONF_API_KEY]
-    api_secret = config[DOMAIN][CONF_API_SECRET]
+async def async_setup(hass, config):
     name = config[DOMAIN].get(CONF_NAME)
-    miners = config[DOMAIN].get(CONF_MINING)
 
-    hass.data[DATA_SBICRYPTO] = sbicrypto_data = SBICryptoData(api_key, api_secret, miners)
+    credentials = list(config[DOMAIN][CONF_ACCOUNTS])
+    if CONF_API_KEY in config[DOMAIN]:
+        credentials.insert(0, { 
+            CONF_API_KEY: config[DOMAIN][CONF_API_KEY],
+            CONF_API_SECRET: config[DOMAIN][CONF_API_SECRET],
+            CONF_MINING: config[DOMAIN][CONF_MINING],
+        })
 
-    if not hasattr(sbicrypto_data, "mining") or "accounts" not in sbicrypto_data.mining:
-        pass
+    # every set of credentials gets its own client, all on the shared session
+    session = async_get_clientsession(hass)
+
+    scheduler = AdaptiveInterval(
+        config[DOMAIN][CONF_SCAN_INTERVAL], 
+        config[DOMAIN][CONF_FAST_SCAN_INTERVAL], 
+        config[DOMAIN][CONF_MAX_BACKOFF]
+    )
+
+    history = HashrateHistory(config[DOMAIN][CONF_HISTORY_SIZE], config[DOMAIN][CONF_HASHRATE_DROP])
+    sbicrypto_data = SBICryptoData(credentials, session, history, ShardPlan(config[DOMAIN][CONF_SHARDS]), scheduler)
+
+    # raw responses kept for offline replay, one file prefix per API key
+    if CONF_RECORD_RESPONSES in config[DOMAIN]:
+        directory = hass.config.path(config[DOMAIN][CONF_RECORD_RESPONSES])
+        for i, (client, _) in enumerate(sbicrypto_data.clients):
+            client.recorder = ResponseRecorder(directory, prefix=f"key{i + 1}")
+
+    # earnings and payouts, synced into a local database
+    if config[DOMAIN][CONF_EARNINGS]:
+        store = EarningsStore(hass.config.path(EARNINGS_DATABASE))
+        sbicrypto_data.earnings = EarningsSync(store, config[DOMAIN][CONF_EARNINGS_INTERVAL], sbicrypto_data.metrics)
+
+        async def async_close_store(event):
+            await hass.async_add_executor_job(store.close)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_store)
+
+    hass.data[DATA_SBICRYPTO] = coordinator = SBICryptoDataUpdateCoordinator(hass, sbicrypto_data, scheduler)
+
+    # Prometheus text dump of the refresh metrics, when the HTTP API is running
+    if "http" in hass.config.components:
+        hass.http.register_view(SBICryptoMetricsView(sbicrypto_data.metrics))
+
+    async def async_profile_refresh(call):
+        """Profile one refresh, sensor updates included, into the config directory."""
+        try:
+            paths = await async_profile(
+                coordinator.async_refresh_all_listeners, 
+                lambda name: hass.config.path(f"{DOMAIN}_{name}"), 
+                call.data[ATTR_TOP]
+            )
+        except ProfilerBusyError as e:
+            raise HomeAssistantError(str(e)) from e
+            
+        _LOGGER.info(f"Refresh profile written to {paths['report']} and {paths['pstats']}")
+        if getattr(call, "return_response", False):
+            return paths
+
+    if SupportsResponse is not None:
+        hass.services.async_register(
+            DOMAIN, SERVICE_PROFILE, async_profile_refresh, schema=PROFILE_SCHEMA, supports_response=SupportsResponse.OPTIONAL
+        )
     else:
-        for account, type in sbicrypto_data.mining["accounts"].items():
-            if "workers" in type:
-                for worker in type["workers"]:
-                    worker["prefix"] = name
-                    load_platform(hass, "sensor", DOMAIN, worker, config)
-                    
-            if "status" in type:
-                type["status"]["prefix"] = name
-                load_platform(hass, "sensor", DOMAIN, type["status"], config)                                        
+        hass.services.async_register(DOMAIN, SERVICE_PROFILE, async_profile_refresh, schema=PROFILE_SCHEMA)
+
+    # start from the last good snapshot, if any, and let the live refresh
+    # catch up in the background instead of blocking the startup on it
+    if await coordinator.async_restore():
+        hass.async_create_task(coordinator.async_refresh())
+    else:
+        await coordinator.async_refresh()
+
+    # all the worker and status sensors are created by one platform setup
+    discovery_info = { 
+        "prefix": name, 
+        "hashrate_deadband": config[DOMAIN][CONF_HASHRATE_DEADBAND],
+        "rollup": config[DOMAIN][CONF_ROLLUP],
+        "rollup_top": config[DOMAIN][CONF_ROLLUP_TOP],
+        "workers": config[DOMAIN][CONF_WORKERS],
+    }
+    hass.async_create_task(
+        async_load_platform(hass, "sensor", DOMAIN, discovery_info, config)
+    )
     return True
 
 
+FINGERPRINT_MASK = (1 << 64) - 1
+
+WORKER_STATES = { 
+    "": "UNKNOWN", 
+    "DEAD": "DEAD", 
+    "OFFLINE": "OFFLINE", 
+    "ONLINE": "ONLINE" 
+}
+
+
+class SBICryptoWorker:
+    """Compact record of a single pool worker.
+
+    Large fleets keep tens of thousands of these around, so the record uses
+    __slots__ instead of the per-worker dict returned by the API, and the
+    repeated state and subaccount strings are interned.
+    """
+
+    __slots__ = ("name", "subaccount", "subaccount_id", "state", "last_share_time", "hrate10m", "hrate1h", "hrate24h")
+
+    def __init__(self, name, subaccount, subaccount_id, state, last_share_time, hrate10m, hrate1h, hrate24h):
+        self.name = name
+        self.subaccount = intern(subaccount)
+        self.subaccount_id = subaccount_id
+        self.state = intern(state)
+        self.last_share_time = last_share_time
+        self.hrate10m = hrate10m
+        self.hrate1h = hrate1h
+        self.hrate24h = hrate24h
+
+
+    @property
+    def hashrates(self) -> Tuple[int, int, int]:
+        return (self.hrate10m, self.hrate1h, self.hrate24h)
+
+
+    def fingerprint(self) -> int:
+        return hash((
+            self.name, self.subaccount, self.subaccount_id, self.state, self.last_share_time, 
+            self.hrate10m, self.hrate1h, self.hrate24h
+        ))
+
+
+    @classmethod
+    def from_api(cls, worker: Dict) -> "SBICryptoWorker":
+        """Build from a /workers record, converting the hashrates from MH/s to H/s."""
+        hashrates = worker["hashrates"]
+        return cls(
+            worker["name"], worker["subaccount"], worker["subaccountId"], worker["state"], worker["lastShareTime"],
+            round(hashrates[0] * 1000000), round(hashrates[1] * 1000000), round(hashrates[2] * 1000000)
+        )
+
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "SBICryptoWorker":
+        """Build from the dict produced by as_dict."""
+        return cls(
+            data["name"], data["subaccount"], data["subaccountId"], data["state"], data["lastShareTime"], *data["hashrates"]
+        )
+
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "lastShareTime": self.last_share_time,
+            "subaccountId": self.subaccount_id,
+            "subaccount": self.subaccount,
+            "hashrates": list(self.hashrates),
+        }
+
+
+class WorkerAggregator:
+    """Group the pool workers by subaccount in a single pass.
+
+    Workers are fed one at a time with add, so they can come straight from
+    a streamed /workers response; the account list is only needed at the
+    end, to attach the coin and drop workers of unknown subaccounts.
+    """
+
+    def __init__(self):
+        self._groups = {}
+        # accName: fingerprint of the account and its workers, filled by result
+        self.fingerprints: Dict[str, int] = {}
+
+
+    def add(self, worker: Dict):
+        group = self._groups.get(worker["subaccount"])
+        if group is None:
+            group = self._groups[worker["subaccount"]] = { 
+                "workers": [], 
+                "fingerprint": 0
+            }
+            
+        record = SBICryptoWorker.from_api(worker)
+        group["workers"].append(record)
+        # order independent, and only meant to be compared within the process
+        group["fingerprint"] = (group["fingerprint"] + record.fingerprint()) & FINGERPRINT_MASK
+
+
+    def result(self, accounts: List[Dict]) -> Dict[str, Dict]:
+        """Every account gets its status and, when it has any, its list of 
+        SBICryptoWorker records. The state counts and mean hashrates of the 
+        status are left at zero, for set_statistics to fill in.
+        """
+        result = {}
+        
+        for account in accounts:
+            accName = account["subaccountName"]
+            group = self._groups.get(accName)
+            
+            status = { 
+                "workerStatus": { 
+                    "OFFLINE" : 0, 
+                    "DEAD": 0, 
+                    "ONLINE": 0, 
+                    "UNKNOWN": 0 
+                }, 
+                "numOfWorkers": 0, 
+                "hashrate": [ 0, 0, 0 ],
+                "coin": account["currentMiningCurrency"]["code"].lower(),
+                "name": accName
+            } 
+            result[accName] = { "status": status }
+            self.fingerprints[accName] = hash((status["coin"], group["fingerprint"] if group is not None else None))
+            
+            if group is not None:
+                status["numOfWorkers"] = len(group["workers"])
+                result[accName]["workers"] = group["workers"]
+            
+        return result
+
+
+def aggregate_workers(accounts: List[Dict], workers_list) -> Dict[str, Dict]:
+    """Aggregate an already decoded /workers response, see WorkerAggregator."""
+    aggregator = WorkerAggregator()
+    
+    for worker in workers_list:
+        aggregator.add(worker)
+        
+    result = aggregator.result(accounts)
+    statistics = account_statistics({ accName: type.get("workers", []) for accName, type in result.items() })
+    for accName, values in statistics.items():
+        set_statistics(result[accName]["status"], values)
+    return result
+
+
+def set_statistics(status: Dict, values: Dict):
+    """Complete an account status with its stats.account_statistics values."""
+    status["statistics"] = values
+    status["workerStatus"] = { state: values["states"][state]["count"] for state in status["workerStatus"] }
+    status["hashrate"] = [ round(mean) for mean in values["mean"] ]
+
+
+class SBICryptoDataUpdateCoordinator(DataUpdateCoordinator):
+    """Fetches the pool data once per interval and pushes it to the sensors."""
+
+    def __init__(self, hass, sbicrypto_data, scheduler: Optional[AdaptiveInterval] = None):
+        """Initialize."""
+        if scheduler is None:
+            scheduler = AdaptiveInterval(DEFAULT_SCAN_INTERVAL, DEFAULT_FAST_SCAN_INTERVAL, DEFAULT_MAX_BACKOFF)
+            
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=scheduler.interval / sbicrypto_data.shards.count)
+        self.sbicrypto_data = sbicrypto_data
+        self.scheduler = scheduler
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._notified_success = False
+        self._earnings_task: Optional[asyncio.Task] = None
+        # listeners told about every refresh, even one that changed nothing
+        self._diagnostic_listeners: List[Callable[[], None]] = []
+
+
+    async def async_restore(self) -> bool:
+        """Load the last persisted snapshot. Returns True if there was one."""
+        snapshot = await self._store.async_load()
+
+        if not snapshot or not self.sbicrypto_data.restore(snapshot):
+            return False
+
+        _LOGGER.debug("Mining data restored from the last snapshot")
+        self.data = self.sbicrypto_data.mining
+        return True
+
+
+    async def _async_update_data(self):
+        try:
+            await self.sbicrypto_data.async_update()
+        except (SBICryptoAPIException, SBICryptoRequestException) as e:
+            # the next refresh is scheduled from update_interval once we return
+            self.update_interval = self.scheduler.failure(getattr(e, "retry_after", None))
+            raise UpdateFailed(
+                f"Error fetching mining data from pool-api.sbicrypto.com: {e}, retrying in {self.update_interval}"
+            ) from e
+
+        history = self.sbicrypto_data.history
+        for (account, name), degraded in self.sbicrypto_data.hashrate_flips:
+            self.hass.bus.async_fire(EVENT_HASHRATE_DROP, {
+                "account": account,
+                "worker": name,
+                "degraded": degraded,
+                "hashrate": self.sbicrypto_data.get_worker(account, name).hrate10m,
+                "baseline": history.baseline(account, name),
+            })
+
+        # every refresh covers one shard, so all of them go round once per interval
+        self.update_interval = self.scheduler.success(self.sbicrypto_data.state_changes > 0) / self.sbicrypto_data.shards.count
+        _LOGGER.debug(f"Next refresh of mining data in {self.update_interval}")
+
+        # the earnings sync pages through other endpoints, the mining data
+        # does not wait for it
+        earnings = self.sbicrypto_data.earnings
+        if earnings is not None and earnings.due() and (self._earnings_task is None or self._earnings_task.done()):
+            self._earnings_task = self.hass.async_create_task(self._async_sync_earnings())
+
+        if self.sbicrypto_data.changed_accounts:
+            self._store.async_delay_save(self._snapshot, STORAGE_SAVE_DELAY)
+        return self.sbicrypto_data.mining
+
+
+    def _snapshot(self) -> Dict:
+        return self.sbicrypto_data.snapshot()
+
+
+    async def _async_sync_earnings(self):
+        sbicrypto_data = self.sbicrypto_data
+        await sbicrypto_data.async_sync_earnings()
+        if not sbicrypto_data.revenue_changed:
+            return
+            
+        # only the revenue sensors have something new, the mining sensors
+        # were told about the changed accounts by the last refresh already
+        changed_accounts = sbicrypto_data.changed_accounts
+        sbicrypto_data.changed_accounts = set()
+        try:
+            self.async_update_listeners()
+        finally:
+            sbicrypto_data.changed_accounts = changed_accounts
+            sbicrypto_data.revenue_changed = False
+
+
+    async def async_refresh_all_listeners(self):
+        """Refresh and update every sensor even if nothing changed, for a complete profile."""
+        self._notified_success = False
+        self.sbicrypto_data.force_update = True
+        try:
+            await self.async_refresh()
+        finally:
+            self.sbicrypto_data.force_update = False
+
+
+    @callback
+    def async_add_diagnostic_listener(self, update_callback: Callable[[], None]) -> Callable[[], None]:
+        """Also call `update_callback` after the refreshes that changed nothing. Returns its remover."""
+        self._diagnostic_listeners.append(update_callback)
+
+        @callback
+        def remove_listener():
+            self._diagnostic_listeners.remove(update_callback)
+
+        return remove_listener
+
+
+    @callback
+    def async_update_listeners(self) -> None:
+        # after a refresh that changed nothing there is nothing to tell the
+        # sensors, unless they have to come back from being unavailable;
+        # the diagnostics still move on with every refresh
+        sbicrypto_data = self.sbicrypto_data
+        if self.last_update_success and self._notified_success and not sbicrypto_data.changed_accounts and not sbicrypto_data.revenue_changed:
+            for update_callback in list(self._diagnostic_listeners):
+                update_callback()
+            return
+            
+        self._notified_success = self.last_update_success
+        with self.sbicrypto_data.metrics.timer("listeners_seconds", "Time spent notifying the sensors"):
+            super().async_update_listeners()
+
+
 class SBICryptoData:
-    def __init__(self, api_key, api_secret, miners = []):
+    def __init__(
+            self, credentials: List[Dict], session: Optional[aiohttp.ClientSession] = None, 
+            history: Optional[HashrateHistory] = None, shards: Optional[ShardPlan] = None, 
+            scheduler: Optional[AdaptiveInterval] = None
+    ):
         """Initialize."""
-        self.client = SBICryptoPoolClient(api_key, api_secret)
-        self.mining = {}
+        self.metrics = Metrics()
+        self.clients = [ 
+            (
+                AsyncSBICryptoPoolClient(item[CONF_API_KEY], item[CONF_API_SECRET], session=session, metrics=self.metrics), 
+                set(item.get(CONF_MINING, []))
+            )
+            for item in credentials
+        ]
+        self.mining = { "accounts": {} }
+        self.workers_index: Dict[Tuple[str, str], SBICryptoWorker] = {}
+        self.accounts_index: Dict[str, Dict] = {}
+        self.coins_index: Dict[str, List[str]] = {}
+        self.state_changes = 0
+        self.history = history if history is not None else HashrateHistory()
+        self.shards = shards if shards is not None else ShardPlan()
+        # paces the retries of an API key failing while the others work
+        self.scheduler = scheduler if scheduler is not None else AdaptiveInterval(
+            DEFAULT_SCAN_INTERVAL, DEFAULT_FAST_SCAN_INTERVAL, DEFAULT_MAX_BACKOFF
+        )
+        # workers whose degraded flag flipped with the last update
+        self.hashrate_flips: List[Tuple[Tuple[str, str], bool]] = []
+        
+        # accounts whose data changed with the last update
+        self.changed_accounts: set = set()
+        
+        # names of the accounts last fetched with each client, None until known
+        self._client_accounts: List[Optional[set]] = [ None ] * len(self.clients)
+        # fingerprints of the /account and /workers bodies each client last had
+        self._client_payloads: List[Optional[Tuple]] = [ None ] * len(self.clients)
+        # what the clients that came through the fetch of the current round
+        # of shards returned: see _async_fetch, None for unchanged payloads
+        self._round: Dict[int, Optional[Tuple]] = {}
+        # failures in a row of each client, and the time.monotonic() until 
+        # which a client left behind by the others is not asked again
+        self._client_failures: List[int] = [ 0 ] * len(self.clients)
+        self._client_held: List[float] = [ 0.0 ] * len(self.clients)
+        # fingerprint of the last data of each account
+        self._fingerprints: Dict[str, int] = {}
+        
+        # set to an earnings.EarningsSync to keep the earnings and payouts
+        self.earnings: Optional[EarningsSync] = None
+        # whether the revenue figures changed with the running earnings sync
+        self.revenue_changed = False
+        # set while every sensor has to take the data, changed or not
+        self.force_update = False
+        
+
+    async def async_update(self):
+        with self.metrics.timer("refresh_seconds", "Duration of a whole refresh"):
+            await self._async_update()
+
 
-        if miners: 
-            self.mining = { "accounts": {} }
-            for account in miners:
-                self.mining["accounts"] = { account: {} }
+    async def _async_update(self):
+        if not self.clients:
+            raise SBICryptoRequestException("No API keys configured")
+            
+        # the pool API has no per-account filter, so the payloads are fetched
+        # once per round of the shards, and every step processes its share
+        if self.shards.current == 0:
+            await self._async_fetch_round()
+        skip = self.shards.others()
+            
+        previous = self.mining["accounts"]
+        fetched = {}
+        fingerprints = {}
+        keep = set()
+        # accounts the pool reported on this refresh, changed or not
+        current = set()
+        
+        for i in range(len(self.clients)):
+            if i not in self._round:
+                # backing off, or failed this round
+                keep |= self._client_accounts[i] if self._client_accounts[i] is not None else previous.keys()
+                continue
+                
+            result = self._round[i]
+            if result is None:
+                # the same payloads as last round, the accounts are kept as they are
+                keep |= self._client_accounts[i] or set()
+                current |= (self._client_accounts[i] or set()) - skip
+            else:
+                # the accounts of the other shards are kept until their turn
+                accounts, account_fingerprints, _, names = result
+                keep |= names
+                for accName, type in accounts.items():
+                    if accName not in skip:
+                        fetched[accName] = type
+                        fingerprints[accName] = account_fingerprints[accName]
+                current |= fetched.keys()
+                
+        aggregation = time.perf_counter()
+        
+        # accounts whose slice of the payloads did not change keep their
+        # previous data, so they are neither re-aggregated nor notified
+        changed = {}
+        for accName, type in fetched.items():
+            if accName in previous and self._fingerprints.get(accName) == fingerprints[accName]:
+                fetched[accName] = previous[accName]
+            else:
+                changed[accName] = type
                 
-            self.update()                
+        statistics = account_statistics({ accName: type.get("workers", []) for accName, type in changed.items() })
+        for accName, values in statistics.items():
+            set_statistics(changed[accName]["status"], values)
+            
+        accounts = { accName: previous[accName] for accName in keep - fetched.keys() if accName in previous }
+        accounts.update(fetched)
+        
+        self._fingerprints.update(fingerprints)
+        self._fingerprints = { accName: self._fingerprints[accName] for accName in accounts if accName in self._fingerprints }
+        self.changed_accounts = changed.keys() | (previous.keys() - accounts.keys())
         
+        self.metrics.counter("refresh_accounts_total", "Accounts by outcome of the refresh", result="changed").inc(len(changed))
+        self.metrics.counter("refresh_accounts_total", "Accounts by outcome of the refresh", result="unchanged").inc(len(accounts.keys() - skip) - len(changed))
+        
+        self.shards.update(accounts, { accName: len(type.get("workers", [])) for accName, type in fetched.items() })
+        self.shards.advance()
+        
+        if self.changed_accounts:
+            self.mining["accounts"] = accounts
+            _LOGGER.debug(f"Mining status updated for {len(changed)} of {len(fetched)} accounts from pool-api.sbicrypto.com")
+            self._rebuild_index()
+        else:
+            _LOGGER.debug("Mining data unchanged at pool-api.sbicrypto.com")
+            self.state_changes = 0
+        
+        # one sample per worker per refresh, unchanged or not; only the
+        # accounts kept for a failing key or another shard are stale
+        self.hashrate_flips = self.history.update(
+            (worker for accName in current if accName in accounts for worker in accounts[accName].get("workers", [])), 
+            self.workers_index
+        )
+        # a flag flipping is news for the worker sensors, even on unchanged data
+        self.changed_accounts |= { account for (account, _), _ in self.hashrate_flips }
+        
+        self.metrics.summary("aggregation_seconds", "Time spent aggregating the workers", stage="accounts").observe(
+            time.perf_counter() - aggregation
+        )
+
 
-    @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        _LOGGER.debug(f"Fetching mining data from pool-api.sbicrypto.com")
-        try:        
-            if "accounts" in self.mining:
-                coins = []
-                status = self.client.get_account();
-                accounts = status.get("subaccounts", [])
+    async def _async_fetch_round(self):
+        """Fetch the accounts of every API key not backing off, for the steps of a round to process."""
+        _LOGGER.debug("Fetching mining data from pool-api.sbicrypto.com")
+        
+        # keys that failed while others worked back off on their own
+        now = time.monotonic()
+        fetching = [ i for i in range(len(self.clients)) if self._client_held[i] <= now ]
+        if not fetching:
+            raise SBICryptoRequestException(
+                "All API keys are backing off", retry_after=min(self._client_held) - now
+            )
+        
+        # all the pool accounts are fetched side by side; one failing key
+        # does not take the others down, its accounts just keep their last data
+        fetched_results = await asyncio.gather(
+            *[ 
+                self._async_fetch(self.clients[i][0], self.clients[i][1], self._client_payloads[i]) 
+                for i in fetching
+            ], 
+            return_exceptions=True
+        )
+        
+        errors = [ result for result in fetched_results if isinstance(result, BaseException) ]
+        for error in errors:
+            if not isinstance(error, (SBICryptoAPIException, SBICryptoRequestException)):
+                raise error
                 
-                if accounts:
-                    workers_list = self.client.get_workers()
-                    
-                    for account in accounts:
-                        accName = account["subaccountName"]
-                        accCoin = account["currentMiningCurrency"]["code"].lower()
-                        
-                        self.mining["accounts"][accName] = {}                                                
-                        
-                        workers = []
-                        status = { 
-                            "workerStatus": { 
-                                "OFFLINE" : 0, 
-                                "DEAD": 0, 
-                                "ONLINE": 0, 
-                                "UNKNOWN": 0 
-                            }, 
-                            "numOfWorkers": 0, 
-                            "hashrate": [ 0, 0, 0 ],
-                            "coin": accCoin,
-                            "name": accName
-                        }
-                        
-                        if workers_list:
-                            for worker in workers_list:
-                                if accName == worker["subaccount"]:
-                                    worker["hashrates"] = [ round(hr * 1000000) for hr in worker["hashrates"] ]
-                                    worker.pop("coinId", None)
-                                    
-                                    workers.append(worker)
-                                    
-                                    if worker["state"] == "":
-                                        status["workerStatus"]["UNKNOWN"] += 1
-                                    elif worker["state"] == "DEAD":
-                                        status["workerStatus"]["DEAD"] += 1
-                                    elif worker["state"] == "OFFLINE":
-                                        status["workerStatus"]["OFFLINE"] += 1 
-                                    elif worker["state"] == "ONLINE":
-                                        status["workerStatus"]["ONLINE"] += 1                                         
-                               
-                                    status["hashrate"][0] += worker["hashrates"][0]
-                                    status["hashrate"][1] += worker["hashrates"][1]
-                                    status["hashrate"][2] += worker["hashrates"][2]
-                                    
-                                    status["numOfWorkers"] += 1
-                                    
-                            if workers:
-                                status["hashrate"] = [  round(hr / status["numOfWorkers"]) for hr in status["hashrate"] ]
-                                
-                                self.mining["accounts"][accName].update({ "workers": workers })
-                                _LOGGER.debug(f"Mining workers updated for {accName} from pool-api.sbicrypto.com")
+        retry_after = max(( error.retry_after for error in errors if error.retry_after is not None ), default=None)
+        for i, result in zip(fetching, fetched_results):
+            self._client_failures[i] = self._client_failures[i] + 1 if isinstance(result, BaseException) else 0
+            
+        if len(errors) == len(fetched_results):
+            # nothing came through, the coordinator backs the whole refresh off
+            errors[0].retry_after = retry_after
+            raise errors[0]
+            
+        self._round = {}
+        for i, result in zip(fetching, fetched_results):
+            if not isinstance(result, BaseException):
+                self._round[i] = result
+                if result is not None:
+                    self._client_payloads[i] = result[2]
+                    self._client_accounts[i] = result[3]
+                continue
+                
+            delay = self.scheduler.backoff(self._client_failures[i], result.retry_after)
+            self._client_held[i] = now + delay.total_seconds()
+            _LOGGER.warning(
+                f"Error fetching mining data for API key #{i + 1} from pool-api.sbicrypto.com: {result}, retrying in {delay}"
+            )
+
+
+    async def _async_fetch(
+            self, client: "AsyncSBICryptoPoolClient", miners: set, payloads: Optional[Tuple] = None
+    ):
+        """Fetch and aggregate the accounts of one API key, limited to `miners` if given.
+        
+        Returns the aggregated accounts, their fingerprints, the fingerprints 
+        of the payloads and the names of all the accounts, or None if the 
+        payloads are the same as `payloads`.
+        """
+        aggregator = WorkerAggregator()
+        spent = 0.0
+
+        async def stream_workers():
+            nonlocal aggregator, spent
+            aggregator = WorkerAggregator()
+            async for worker in client.iter_workers():
+                start = time.perf_counter()
+                aggregator.add(worker)
+                spent += time.perf_counter() - start
+        
+        if client.circuit_breaker.state == CircuitBreaker.CLOSED:
+            # both endpoints are independent, so issue them side by side
+            # over the same keep-alive session; the workers are aggregated
+            # while their response is still being received
+            status, _ = await _gather_or_cancel(
+                client.get_account(), 
+                stream_workers()
+            )
+        else:
+            # the circuit lets a single probe through: the account goes
+            # first and the workers follow once it closed the circuit again
+            status = await client.get_account()
+            await stream_workers()
+        
+        fetched = (client.fingerprints.get("account"), client.fingerprints.get("workers"))
+        if None not in fetched and fetched == payloads:
+            return None
+            
+        if "workers" in client.not_modified:
+            # the accounts changed under the same workers; the workers of a
+            # new account were left out last time, so they are needed again
+            client.forget_etag("workers")
+            await stream_workers()
+            fetched = (client.fingerprints.get("account"), client.fingerprints.get("workers"))
+            
+        accounts = status.get("subaccounts", [])
+        
+        if miners:
+            accounts = [ account for account in accounts if account["subaccountName"] in miners ]
+            
+        names = { account["subaccountName"] for account in accounts }
+        
+        start = time.perf_counter()
+        result = aggregator.result(accounts)
+        self.metrics.summary("aggregation_seconds", "Time spent aggregating the workers", stage="workers").observe(
+            spent + time.perf_counter() - start
+        )
+        return result, aggregator.fingerprints, fetched, names
+
+
+    async def async_sync_earnings(self):
+        """Pull the new earnings and payouts of every API key, when a sync is due.
+        
+        Runs alongside the refreshes of the mining data; a failure only 
+        delays the revenue figures until the next sync, so it is logged.
+        """
+        self.revenue_changed = False
+        
+        if self.earnings is None or not self.earnings.due():
+            return
+            
+        with self.metrics.timer("earnings_sync_seconds", "Duration of an earnings and payouts sync"):
+            try:
+                for i, (client, miners) in enumerate(self.clients):
+                    try:
+                        await self.earnings.async_sync_client(client, miners)
+                    except (SBICryptoAPIException, SBICryptoRequestException) as e:
+                        _LOGGER.warning(f"Error fetching earnings for API key #{i + 1} from pool-api.sbicrypto.com: {e}")
                         
-                        self.mining["accounts"][accName].update({ "status": status })
-                        _LOGGER.debug(f"Mining status updated for {accName} from pool-api.sbicrypto.com")    
-                                      
-        except (SBICryptoAPIException, SBICryptoRequestException) as e:
-            _LOGGER.error(f"Error fetching mining data from pool-api.sbicrypto.com: {e.message}")
-            return False                                       
+                self.revenue_changed = await self.earnings.async_load_revenue()
+            except sqlite3.Error as e:
+                _LOGGER.error(f"Earnings database {self.earnings.store.path} failed: {e}")
+
+
+    def restore(self, snapshot: Dict) -> bool:
+        """Seed the mining data from a persisted snapshot."""
+        if not snapshot.get("accounts"):
+            return False
+            
+        for accName, type in snapshot["accounts"].items():
+            account = {}
+            if "status" in type:
+                account["status"] = type["status"]
+            if "workers" in type:
+                account["workers"] = [ SBICryptoWorker.from_dict(worker) for worker in type["workers"] ]
+            self.mining["accounts"][accName] = account
+            
+        self._rebuild_index()
+        return True
+
+
+    def snapshot(self) -> Dict:
+        """JSON serializable copy of the mining accounts, see restore."""
+        accounts = {}
+        
+        for accName, type in self.mining.get("accounts", {}).items():
+            account = accounts[accName] = {}
+            if "status" in type:
+                account["status"] = type["status"]
+            if "workers" in type:
+                account["workers"] = [ worker.as_dict() for worker in type["workers"] ]
+                
+        return { "accounts": accounts }
+
+
+    def _rebuild_index(self):
+        """Index the snapshot by (subaccount, worker name) and by account name.
+        
+        Also counts the workers that changed state, appeared or vanished 
+        since the previous snapshot.
+        """
+        previous = self.workers_index
+        workers_index = {}
+        accounts_index = {}
+        coins_index = {}
+        changes = 0
+        
+        for accName, type in self.mining["accounts"].items():
+            if "status" in type:
+                accounts_index[accName] = type["status"]
+                coins_index.setdefault(type["status"]["coin"], []).append(accName)
+                
+            for worker in type.get("workers", []):
+                key = (worker.subaccount, worker.name)
+                workers_index[key] = worker
+                
+                before = previous.get(key)
+                if before is None or before.state != worker.state:
+                    changes += 1
+                
+        self.state_changes = (changes + len(previous.keys() - workers_index.keys())) if previous else 0
+        self.workers_index = workers_index
+        self.accounts_index = accounts_index
+        self.coins_index = coins_index
+
+
+    def get_worker(self, account: str, name: str) -> Optional[SBICryptoWorker]:
+        return self.workers_index.get((account, name))
+
+
+    def get_account_status(self, account: str) -> Optional[Dict]:
+        return self.accounts_index.get(account)
+
+
+    def get_account_workers(self, account: str) -> List[SBICryptoWorker]:
+        return self.mining["accounts"].get(account, {}).get("workers", [])
+
+
+    @property
+    def revenue(self) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Earned and paid out amounts by (account, coin), see EarningsStore.revenue."""
+        return self.earnings.revenue if self.earnings is not None else {}
             
             
 class SBICryptoPoolClient():
     API_VERSION = 'v1'
     API_URL = 'https://pool-api.sbicrypto.com/api/external/{}'
     
-    REQUEST_TIMEOUT: float = 20    
+    # a connection that does not come up, and one that stops sending
+    CONNECT_TIMEOUT: float = 5
+    READ_TIMEOUT: float = 15
+    # all the attempts of one call, including the delays between them
+    REQUEST_BUDGET: float = 45
     
     
     def __init__(
-            self, api_key: Optional[str] = None, api_secret: Optional[str] = None, requests_params: Dict[str, str] = None
+            self, api_key: Optional[str] = None, api_secret: Optional[str] = None, requests_params: Dict[str, str] = None,
+            metrics: Optional[Metrics] = None
     ):
         self.API_URL = self.API_URL.format(self.API_VERSION)
         self.API_KEY = api_key
@@ -174,6 +900,17 @@ class SBICryptoPoolClient():
         self._requests_params = requests_params
         self.response = None
         self.timestamp_offset = 0
+        self.retry_policy = RetryPolicy(budget=self.REQUEST_BUDGET)
+        self.circuit_breaker = CircuitBreaker()
+        self.metrics = metrics if metrics is not None else Metrics()
+        # set to a capture.ResponseRecorder to keep the raw responses
+        self.recorder = None
+        # digest of the last body received from each endpoint
+        self.fingerprints: Dict[str, str] = {}
+        # endpoints whose last answer was 304 Not Modified
+        self.not_modified = set()
+        # uri: (ETag, decoded body) of the last response that came with an ETag
+        self._etags: Dict[str, Tuple[str, object]] = {}
          
     
     def _get_headers(self) -> Dict:
@@ -204,8 +941,8 @@ class SBICryptoPoolClient():
 
     def _get_request_kwargs(self, method, signed: bool, force_params: bool = False, **kwargs) -> Dict:
 
-        # set default requests timeout
-        kwargs['timeout'] = self.REQUEST_TIMEOUT
+        # set default requests timeouts
+        kwargs['timeout'] = (self.CONNECT_TIMEOUT, self.READ_TIMEOUT)
 
         # add our global requests params
         if self._requests_params:
@@ -245,28 +982,165 @@ class SBICryptoPoolClient():
     def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
 
         kwargs = self._get_request_kwargs(method, signed, force_params, **kwargs)
+        self._conditional(uri, kwargs)
 
-        self.response = getattr(self.session, method)(uri, **kwargs)
-        return self._handle_response(self.response)
+        self._before_request()
+        started = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            sent = time.monotonic()
+            try:
+                try:
+                    self.response = getattr(self.session, method)(uri, **kwargs)
+                except requests.RequestException as e:
+                    raise SBICryptoRequestException(f"Request to {uri} failed: {e!r}")
+                result = self._handle_response(self.response, uri, sent)
+            except (SBICryptoAPIException, SBICryptoRequestException) as e:
+                delay = self._retry_delay(method, attempt, e, started)
+                if delay is None:
+                    self._record_outcome(e, uri)
+                    raise
+                _LOGGER.debug(f"Retrying {uri} in {delay:.1f}s after: {e}")
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.circuit_breaker.release()
+                raise
+                
+            self._record_outcome(None, uri, attempt, started)
+            return result
 
 
-    @staticmethod
-    def _handle_response(response: requests.Response):
+    def _before_request(self):
+        try:
+            self.circuit_breaker.before_request()
+        except CircuitOpenError as e:
+            self.metrics.counter("requests_throttled_total", "Requests held back", reason="circuit_open").inc()
+            raise SBICryptoRequestException(str(e))
+
+
+    def _retry_delay(self, method, attempt: int, error: Exception, started: float) -> Optional[float]:
+        """Seconds to wait before trying the request again, None if the error is final.
+
+        Only idempotent GETs are retried, only on network errors and server side
+        failures, and only while the next attempt still fits in the budget.
+        """
+        if method != 'get' or attempt >= self.retry_policy.attempts:
+            return None
+            
+        if isinstance(error, SBICryptoAPIException):
+            if error.status_code < 500:
+                return None
+        elif not isinstance(error, SBICryptoRequestException):
+            return None
+            
+        delay = self.retry_policy.delay(attempt)
+        if time.monotonic() + delay - started >= self.retry_policy.budget:
+            return None
+        return delay
+
+
+    def _record_outcome(self, error: Optional[Exception], uri: str = None, attempt: int = 0, started: float = 0):
+        """Feed the circuit breaker and the metrics. A 4xx other than 429 still means the API is up."""
+        endpoint = self._endpoint(uri)
+        
+        if error is None:
+            elapsed = time.monotonic() - started
+            self.circuit_breaker.record_success()
+            self.metrics.summary("http_request_seconds", "Pool API call latency, retries included", endpoint=endpoint).observe(elapsed)
+            _LOGGER.debug(f"{uri} answered in {elapsed:.2f}s, attempts: {attempt}")
+            return
+            
+        self.metrics.counter("http_errors_total", "Failed pool API calls", endpoint=endpoint).inc()
+        
+        if isinstance(error, SBICryptoAPIException) and error.status_code == 429:
+            self.metrics.counter("requests_throttled_total", "Requests held back", reason="rate_limit").inc()
+            
+        if isinstance(error, SBICryptoAPIException) and error.status_code < 500 and error.status_code != 429:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+
+
+    def _handle_response(self, response: requests.Response, uri: str = None, sent: float = None):
         """Internal helper for handling API responses from the SBICrypto server.
         Raises the appropriate exceptions when necessary; otherwise, returns the
         response.
         """
+        endpoint = self._endpoint(uri)
+        
+        if self.recorder is not None and sent is not None:
+            self._capture(
+                endpoint, response.status_code, response.headers, response.content, 
+                response.elapsed.total_seconds(), time.monotonic() - sent
+            )
+            
+        if response.status_code == 304 and uri in self._etags:
+            return self._unchanged(uri, endpoint)
+            
         if not (200 <= response.status_code < 300):
             raise SBICryptoAPIException(response, response.status_code, response.text)
+            
+        self.metrics.summary("http_response_bytes", "Pool API response size", endpoint=endpoint).observe(len(response.content))
         try:
-            return response.json()
+            with self.metrics.timer("json_decode_seconds", "Time spent decoding the responses", endpoint=endpoint):
+                result = response.json()
         except ValueError:
             raise SBICryptoRequestException('Invalid Response: %s' % response.text)
+            
+        self._changed(uri, endpoint, response.headers, hashlib.blake2b(response.content, digest_size=16).hexdigest(), result)
+        return result
 
 
     def _create_api_url(self, path: str ) -> str:
         return self.API_URL + '/' + path
 
+
+    def _capture(self, endpoint: str, status: int, headers, body: bytes, headers_after: float, elapsed: float):
+        self.recorder.write(endpoint, status, headers, body, headers_after, elapsed)
+
+
+    def _conditional(self, uri: str, kwargs: Dict, streaming: bool = False):
+        """Ask for the body only if it changed, when the last response came with an ETag.
+        
+        A streamed body is not kept, so it only helps a later streaming call.
+        """
+        cached = self._etags.get(uri)
+        if cached is not None and (streaming or cached[1] is not None):
+            kwargs['headers'] = { **kwargs.get('headers', {}), 'If-None-Match': cached[0] }
+
+
+    def _unchanged(self, uri: str, endpoint: str):
+        """A 304 answer: the body is the one decoded last time."""
+        self.not_modified.add(endpoint)
+        self.metrics.counter("http_not_modified_total", "Pool API calls answered with 304 Not Modified", endpoint=endpoint).inc()
+        return self._etags[uri][1]
+
+
+    def _changed(self, uri: str, endpoint: str, headers, fingerprint: str, result):
+        self.not_modified.discard(endpoint)
+        self.fingerprints[endpoint] = fingerprint
+        
+        etag = headers.get('ETag')
+        if etag:
+            self._etags[uri] = (etag, result)
+        else:
+            self._etags.pop(uri, None)
+
+
+    def forget_etag(self, path: str):
+        """Make the next call to `path` unconditional."""
+        self._etags.pop(self._create_api_url(path), None)
+
+
+    def _endpoint(self, uri: Optional[str]) -> str:
+        """Metrics label of a request: the API path without the base URL."""
+        if not uri:
+            return "unknown"
+        return uri[len(self.API_URL):].lstrip('/').split('?', 1)[0]
+
       
     def _request_api(self, method, path, signed=False, **kwargs):
         uri = self._create_api_url(path)
@@ -295,16 +1169,336 @@ class SBICryptoPoolClient():
         """
         return self._request_api('get', 'workers')        
 
+
+    def get_earnings(self, **params):
+        """ Earnings credited to the subaccounts, oldest first
+        
+            startTime: only the ones credited from then on (epoch ms)
+            limit: page size
+        """
+        return self._request_api('get', 'earnings', params=params)
+
+
+    def get_payouts(self, **params):
+        """ Payouts sent from the subaccounts, oldest first
         
+            startTime: only the ones sent from then on (epoch ms)
+            limit: page size
+        """
+        return self._request_api('get', 'payouts', params=params)
+
+
+class AsyncSBICryptoPoolClient(SBICryptoPoolClient):
+    """Non-blocking client running on an aiohttp session.
+
+    The session is expected to be Home Assistant's shared one, so the
+    connections to the pool API are pooled and kept alive between refreshes.
+    Credentials are sent per request instead of being baked into the
+    session headers.
+    """
+
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    def __init__(
+            self, api_key: Optional[str] = None, api_secret: Optional[str] = None, requests_params: Dict[str, str] = None,
+            session: Optional[aiohttp.ClientSession] = None, metrics: Optional[Metrics] = None
+    ):
+        self._session = session
+        super().__init__(api_key, api_secret, requests_params, metrics)
+        self._headers = self._get_headers()
+
+
+    def _init_session(self) -> aiohttp.ClientSession:
+        if self._session is None:
+            self._session = aiohttp.ClientSession(headers=self._get_headers())
+        return self._session
+
+
+    def _get_request_kwargs(self, method, signed: bool, force_params: bool = False, **kwargs) -> Dict:
+        kwargs = super()._get_request_kwargs(method, signed, force_params, **kwargs)
+        kwargs['timeout'] = self._attempt_timeout(time.monotonic())
+        kwargs.setdefault('headers', self._headers)
+        return kwargs
+
+
+    def _attempt_timeout(self, started: float, streaming: bool = False) -> aiohttp.ClientTimeout:
+        """Timeouts of one attempt.
+        
+        A hung connection is caught by the connect and read timeouts; the 
+        total only keeps the attempt within what is left of the budget. A 
+        streamed body is processed while it arrives, so it gets no total.
+        """
+        remaining = self.retry_policy.budget - (time.monotonic() - started)
+        return aiohttp.ClientTimeout(
+            total=None if streaming else max(0.1, remaining),
+            sock_connect=self.CONNECT_TIMEOUT,
+            sock_read=self.READ_TIMEOUT
+        )
+
+
+    async def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+
+        kwargs = self._get_request_kwargs(method, signed, force_params, **kwargs)
+        self._conditional(uri, kwargs)
+
+        self._before_request()
+        started = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            kwargs['timeout'] = self._attempt_timeout(started)
+            sent = time.monotonic()
+            try:
+                try:
+                    async with getattr(self.session, method)(uri, **kwargs) as response:
+                        self.response = response
+                        result = await self._handle_response(response, uri, sent)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise SBICryptoRequestException(f"Request to {uri} failed: {e!r}")
+            except (SBICryptoAPIException, SBICryptoRequestException) as e:
+                delay = self._retry_delay(method, attempt, e, started)
+                if delay is None:
+                    self._record_outcome(e, uri)
+                    raise
+                _LOGGER.debug(f"Retrying {uri} in {delay:.1f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.circuit_breaker.release()
+                raise
+                
+            self._record_outcome(None, uri, attempt, started)
+            return result
+
+
+    async def _handle_response(self, response: aiohttp.ClientResponse, uri: str = None, sent: float = None):
+        """Internal helper for handling API responses from the SBICrypto server.
+        Raises the appropriate exceptions when necessary; otherwise, returns the
+        response.
+        """
+        endpoint = self._endpoint(uri)
+        if sent is None:
+            sent = time.monotonic()
+        headers_after = time.monotonic() - sent
+        body = await response.read()
+        
+        if self.recorder is not None:
+            self._capture(endpoint, response.status, response.headers, body, headers_after, time.monotonic() - sent)
+            
+        if response.status == 304 and uri in self._etags:
+            return self._unchanged(uri, endpoint)
+            
+        if not (200 <= response.status < 300):
+            raise SBICryptoAPIException(response, response.status, body.decode("utf-8", "replace"))
+            
+        self.metrics.summary("http_response_bytes", "Pool API response size", endpoint=endpoint).observe(len(body))
+        try:
+            with self.metrics.timer("json_decode_seconds", "Time spent decoding the responses", endpoint=endpoint):
+                result = json.loads(body)
+        except ValueError:
+            raise SBICryptoRequestException('Invalid Response: %s' % await response.text())
+            
+        self._changed(uri, endpoint, response.headers, hashlib.blake2b(body, digest_size=16).hexdigest(), result)
+        return result
+
+
+    async def _request_api(self, method, path, signed=False, **kwargs):
+        uri = self._create_api_url(path)
+        
+        answer = await self._request(method, uri, signed, True, **kwargs)
+        
+        if "content" not in answer:
+           return answer   
+        
+        return answer["content"]
+
+
+    async def get_account(self):
+        return await self._request_api('get', 'account')
+    get_account.__doc__ = SBICryptoPoolClient.get_account.__doc__
+
+
+    async def get_workers(self):
+        return await self._request_api('get', 'workers')
+    get_workers.__doc__ = SBICryptoPoolClient.get_workers.__doc__
+
+
+    async def get_earnings(self, **params):
+        return await self._request_api('get', 'earnings', params=params)
+    get_earnings.__doc__ = SBICryptoPoolClient.get_earnings.__doc__
+
+
+    async def get_payouts(self, **params):
+        return await self._request_api('get', 'payouts', params=params)
+    get_payouts.__doc__ = SBICryptoPoolClient.get_payouts.__doc__
+
+
+    async def iter_workers(self):
+        """ Same as get_workers, but yields the workers one by one while the
+            response is being received, without holding the whole body.
+        """
+        async for worker in self._stream_api('get', 'workers'):
+            yield worker
+
+
+    def _capture(self, endpoint: str, status: int, headers, body: bytes, headers_after: float, elapsed: float):
+        # compressing a large body would stall the event loop
+        asyncio.get_running_loop().run_in_executor(
+            None, self.recorder.write, endpoint, status, dict(headers), body, headers_after, elapsed
+        )
+
+
+    async def _stream_api(self, method, path, signed=False, **kwargs):
+        uri = self._create_api_url(path)
+        endpoint = self._endpoint(uri)
+        kwargs = self._get_request_kwargs(method, signed, True, **kwargs)
+        self._conditional(uri, kwargs, streaming=True)
+
+        self._before_request()
+        started = time.monotonic()
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            kwargs['timeout'] = self._attempt_timeout(started, streaming=True)
+            # once items were handed out the request can't be repeated
+            streaming = False
+            sent = time.monotonic()
+            try:
+                try:
+                    async with getattr(self.session, method)(uri, **kwargs) as response:
+                        self.response = response
+                        headers_after = time.monotonic() - sent
+                        
+                        if response.status == 304 and uri in self._etags:
+                            # nothing to hand out, the caller still has the last items
+                            self._unchanged(uri, endpoint)
+                        else:
+                            if not (200 <= response.status < 300):
+                                text = await response.text()
+                                if self.recorder is not None:
+                                    self._capture(
+                                        endpoint, response.status, response.headers, text.encode(), 
+                                        headers_after, time.monotonic() - sent
+                                    )
+                                raise SBICryptoAPIException(response, response.status, text)
+                                
+                            streaming = True
+                            async for item in self._stream_items(response, uri, endpoint, sent, headers_after):
+                                yield item
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    raise SBICryptoRequestException(f"Request to {uri} failed: {e!r}")
+            except (SBICryptoAPIException, SBICryptoRequestException) as e:
+                delay = None if streaming else self._retry_delay(method, attempt, e, started)
+                if delay is None:
+                    self._record_outcome(e, uri)
+                    raise
+                _LOGGER.debug(f"Retrying {uri} in {delay:.1f}s after: {e}")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                self.circuit_breaker.release()
+                raise
+                
+            self._record_outcome(None, uri, attempt, started)
+            return
+
+
+    async def _stream_items(self, response: aiohttp.ClientResponse, uri: str, endpoint: str, sent: float, headers_after: float):
+        """Decode the items of a successful response while it arrives, keeping its metrics and fingerprint."""
+        # bytes received, seconds spent waiting for them, the digest of the
+        # body and, when recording, the chunks themselves
+        meter = [ 0, 0.0, hashlib.blake2b(digest_size=16), [] if self.recorder is not None else None ]
+        decoding = 0.0
+        items = iter_json_items(
+            self._metered(response.content.iter_chunked(self.STREAM_CHUNK_SIZE), meter), "content"
+        ).__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = await items.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    decoding += time.perf_counter() - start
+                yield item
+        except ValueError as e:
+            raise SBICryptoRequestException(f"Invalid Response: {e}")
+            
+        if meter[3] is not None:
+            self._capture(
+                endpoint, response.status, response.headers, b"".join(meter[3]), 
+                headers_after, time.monotonic() - sent
+            )
+            
+        self.metrics.summary("http_response_bytes", "Pool API response size", endpoint=endpoint).observe(meter[0])
+        self.metrics.summary("json_decode_seconds", "Time spent decoding the responses", endpoint=endpoint).observe(
+            max(0.0, decoding - meter[1])
+        )
+        # the caller keeps the items, there is nothing to cache with the ETag
+        self._changed(uri, endpoint, response.headers, meter[2].hexdigest(), None)
+
+
+    @staticmethod
+    async def _metered(chunks, meter: List):
+        """Pass the chunks through, adding up their size and the time spent waiting for them."""
+        chunks = chunks.__aiter__()
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                return
+            finally:
+                meter[1] += time.perf_counter() - start
+            meter[0] += len(chunk)
+            meter[2].update(chunk)
+            if meter[3] is not None:
+                meter[3].append(chunk)
+            yield chunk
+
+
+async def _gather_or_cancel(*aws):
+    """Like asyncio.gather, but once one of them raises the others are cancelled and awaited."""
+    tasks = [ asyncio.ensure_future(aw) for aw in aws ]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+def _parse_retry_after(value) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
 class SBICryptoAPIException(Exception):
 
     def __init__(self, response, status_code, text):
         self.error = ''
+        self.description = ''
         try:
             _LOGGER.debug(f"SBICryptoAPIException: {response} - {status_code}. {text}")
             json_res = json.loads(text)
         except ValueError:
-            self.message = 'Invalid JSON error message from SBICrypto: {}'.format(response.text)
+            self.message = 'Invalid JSON error message from SBICrypto: {}'.format(text)
         else:
             self.error = json_res.get("error", "")
             self.description = json_res.get("error_description", "")
@@ -312,14 +1506,16 @@ class SBICryptoAPIException(Exception):
         self.status_code = status_code
         self.response = response
         self.request = getattr(response, 'request', None)
+        self.retry_after = _parse_retry_after(getattr(response, 'headers', {}).get('Retry-After'))
 
     def __str__(self):  # pragma: no cover
         return 'APIError(code=%s): %s. %s' % (self.status_code, self.error, self.description)
 
 
 class SBICryptoRequestException(Exception):
-    def __init__(self, message):
+    def __init__(self, message, retry_after: Optional[float] = None):
         self.message = message
+        self.retry_after = retry_after
 
     def __str__(self):
         return 'SBICryptoRequestException: %s' % self.message
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""
+Recording of the raw pool API responses, and replay of the recordings
+
+Every capture is one gzip file holding a JSON line with the metadata
+(endpoint, status, headers and timings) followed by the raw response body.
+The replay transports serve the captures back, in the order they were
+recorded, to the async client (as its aiohttp session) or to the blocking
+client (as a requests transport adapter), with the original latency scaled
+by a factor.
+"""
+import asyncio
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+_LOGGER = logging.getLogger(__name__)
+
+SUFFIX = ".json.gz"
+
+# headers not worth keeping in a capture
+SKIPPED_HEADERS = { "set-cookie", "content-encoding", "transfer-encoding", "content-length", "connection" }
+
+
+class ResponseRecorder:
+    """Writes the responses to `directory`, keeping the newest `max_files` captures."""
+
+    def __init__(self, directory: str, prefix: str = "", max_files: int = 200, compresslevel: int = 6):
+        self.directory = directory
+        self.prefix = prefix
+        self.max_files = max_files
+        self.compresslevel = compresslevel
+        self._sequence = itertools.count()
+
+
+    def write(self, endpoint: str, status: int, headers, body: bytes, headers_after: float, elapsed: float) -> Optional[str]:
+        """Store one response. Blocking, run it in an executor from the event loop."""
+        now = datetime.now(timezone.utc)
+        meta = {
+            "endpoint": endpoint,
+            "status": status,
+            "headers": { key: value for key, value in headers.items() if key.lower() not in SKIPPED_HEADERS },
+            "headers_after": headers_after,
+            "elapsed": elapsed,
+            "size": len(body),
+            "recorded_at": now.isoformat(),
+        }
+        name = f"{self.prefix}{'-' if self.prefix else ''}{now:%Y%m%dT%H%M%S%f}-{next(self._sequence):06d}-{endpoint}{SUFFIX}"
+        path = os.path.join(self.directory, name)
+
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with gzip.open(path, "wb", compresslevel=self.compresslevel) as file:
+                file.write(json.dumps(meta).encode() + b"\n")
+                file.write(body)
+            self._prune()
+        except OSError as e:
+            _LOGGER.warning(f"Could not record the {endpoint} response to {path}: {e}")
+            return None
+
+        return path
+
+
+    def _prune(self):
+        if not self.max_files:
+            return
+        names = sorted(name for name in os.listdir(self.directory) if _is_capture(name, self.prefix))
+        for name in names[:-self.max_files]:
+            os.remove(os.path.join(self.directory, name))
+
+
+def _is_capture(name: str, prefix: str) -> bool:
+    """Whether `name` is a capture written with `prefix` ("key1" does not take "key10-..."), any capture for an empty prefix."""
+    return name.endswith(SUFFIX) and (not prefix or name.startswith(f"{prefix}-"))
+
+
+class Capture:
+    __slots__ = ( "endpoint", "status", "headers", "headers_after", "elapsed", "body" )
+
+    def __init__(self, meta: Dict, body: bytes):
+        self.endpoint = meta["endpoint"]
+        self.status = meta["status"]
+        self.headers = meta.get("headers", {})
+        self.headers_after = meta.get("headers_after", 0.0)
+        self.elapsed = meta.get("elapsed", self.headers_after)
+        self.body = body
+
+
+def load_captures(directory: str, prefix: str = "") -> Dict[str, List[Capture]]:
+    """The captures found in `directory`, by endpoint, in the order they were recorded."""
+    captures = {}
+    for name in sorted(os.listdir(directory)):
+        if not _is_capture(name, prefix):
+            continue
+        with gzip.open(os.path.join(directory, name), "rb") as file:
+            meta = json.loads(file.readline())
+            body = file.read()
+        captures.setdefault(meta["endpoint"], []).append(Capture(meta, body))
+    return captures
+
+
+class _Player:
+    """Hands out the captures of each endpoint in turn, starting over once all were served."""
+
+    def __init__(self, captures: Dict[str, List[Capture]], scale: float = 1.0):
+        if not captures:
+            raise ValueError("No captures to replay")
+        self.scale = scale
+        self._captures = captures
+        self._next = { endpoint: 0 for endpoint in captures }
+        self.requests = 0
+
+    def next(self, url: str) -> Capture:
+        endpoint = str(url).split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        if endpoint not in self._captures:
+            raise KeyError(f"No capture of the {endpoint} endpoint")
+        captures = self._captures[endpoint]
+        capture = captures[self._next[endpoint] % len(captures)]
+        self._next[endpoint] += 1
+        self.requests += 1
+        return capture
+
+
+class _ReplayContent:
+    def __init__(self, capture: Capture, scale: float):
+        self._capture = capture
+        self._scale = scale
+
+    async def iter_chunked(self, size: int):
+        body = self._capture.body
+        chunks = max(1, -(-len(body) // size))
+        # the body arrives evenly over the rest of the recorded time
+        delay = max(0.0, self._capture.elapsed - self._capture.headers_after) * self._scale / chunks
+        for start in range(0, len(body), size):
+            if delay:
+                await asyncio.sleep(delay)
+            yield body[start:start + size]
+
+
+class _ReplayResponse:
+    """The parts of aiohttp.ClientResponse used by the client."""
+
+    def __init__(self, url, capture: Capture, scale: float):
+        self.url = url
+        self.status = capture.status
+        self.headers = CaseInsensitiveDict(capture.headers)
+        self.content = _ReplayContent(capture, scale)
+        self._capture = capture
+        self._scale = scale
+
+    async def read(self) -> bytes:
+        delay = max(0.0, self._capture.elapsed - self._capture.headers_after) * self._scale
+        if delay:
+            await asyncio.sleep(delay)
+        return self._capture.body
+
+    async def text(self) -> str:
+        return (await self.read()).decode("utf-8", "replace")
+
+    async def json(self, content_type=None):
+        return json.loads(await self.read())
+
+
+class _ReplayRequest:
+    def __init__(self, player: _Player, url):
+        self._player = player
+        self._url = url
+
+    async def __aenter__(self) -> _ReplayResponse:
+        capture = self._player.next(self._url)
+        if capture.headers_after * self._player.scale:
+            await asyncio.sleep(capture.headers_after * self._player.scale)
+        return _ReplayResponse(self._url, capture, self._player.scale)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class ReplaySession:
+    """Stands in for the aiohttp session of AsyncSBICryptoPoolClient.
+
+    `scale` multiplies the recorded latencies: 1 replays them as they were,
+    0 serves the captures as fast as possible.
+    """
+
+    def __init__(self, directory: str, prefix: str = "", scale: float = 1.0):
+        self._player = _Player(load_captures(directory, prefix), scale)
+
+    @property
+    def requests(self) -> int:
+        return self._player.requests
+
+    def get(self, url, **kwargs) -> _ReplayRequest:
+        return _ReplayRequest(self._player, url)
+
+    async def close(self):
+        pass
+
+
+class ReplayAdapter(BaseAdapter):
+    """requests transport adapter serving the captures to SBICryptoPoolClient.
+
+        client.session.mount("https://", ReplayAdapter(directory, scale=0.5))
+    """
+
+    def __init__(self, directory: str, prefix: str = "", scale: float = 1.0):
+        super().__init__()
+        self._player = _Player(load_captures(directory, prefix), scale)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        capture = self._player.next(request.url)
+        if capture.elapsed * self._player.scale:
+            time.sleep(capture.elapsed * self._player.scale)
+
+        response = requests.Response()
+        response.status_code = capture.status
+        response.headers = CaseInsensitiveDict(capture.headers)
+        response._content = capture.body
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
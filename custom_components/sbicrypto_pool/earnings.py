@@ -0,0 +1,258 @@
+"""
+Local store of the pool earnings and payouts, synced incrementally
+
+Summing the earnings up from the API on every poll would mean pulling the
+whole history each time. The records are kept in a SQLite file instead:
+every sync asks the pool only for the records from the newest one stored
+on (the high-water mark, kept per API key and kind of record), and the
+revenue sensors are served from indexed queries on that file.
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, Optional, Tuple
+
+from .metrics import Metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+KINDS = ( "earnings", "payouts" )
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    account TEXT NOT NULL,
+    coin TEXT NOT NULL,
+    day TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS records_by_day ON records (kind, day, account, coin, amount);
+CREATE INDEX IF NOT EXISTS records_by_account ON records (kind, account, day, coin, amount);
+CREATE INDEX IF NOT EXISTS records_by_coin ON records (kind, coin, day, account, amount);
+CREATE TABLE IF NOT EXISTS cursors (
+    key TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    time INTEGER NOT NULL,
+    PRIMARY KEY (key, kind)
+);
+"""
+
+# revenue figure: condition on the day of the records, per kind
+REVENUE_COLUMNS = {
+    "earnings": (
+        ( "today", "day >= :today" ),
+        ( "yesterday", "day = :yesterday" ),
+        ( "month", "day >= :month" ),
+        ( "last_month", "day < :month" ),
+    ),
+    "payouts": (
+        ( "paid_month", "day >= :month" ),
+        ( "paid_last_month", "day < :month" ),
+    ),
+}
+REVENUE_FIELDS = tuple(name for columns in REVENUE_COLUMNS.values() for name, _ in columns)
+
+# (id, account, coin, day, time, amount)
+Record = Tuple[str, str, str, str, int, float]
+
+
+def parse_record(item: Dict) -> Optional[Record]:
+    """Row of an /earnings or /payouts record, None if it lacks a field.
+
+    The time may come as epoch milliseconds or as an ISO 8601 string, the
+    coin as its code or as a currency object.
+    """
+    stamp = item.get("time")
+    if isinstance(stamp, str):
+        try:
+            stamp = datetime.fromisoformat(stamp.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        if stamp.tzinfo is None:
+            stamp = stamp.replace(tzinfo=timezone.utc)
+        stamp = int(stamp.timestamp() * 1000)
+
+    coin = item.get("coin")
+    if isinstance(coin, dict):
+        coin = coin.get("code")
+
+    account = item.get("subaccountName")
+    amount = item.get("amount")
+    if not isinstance(stamp, (int, float)) or not account or not coin or amount is None:
+        return None
+
+    stamp = int(stamp)
+    record_id = item.get("id")
+    if record_id is None:
+        record_id = f"{stamp}:{account}:{coin}:{amount}"
+
+    day = datetime.fromtimestamp(stamp / 1000, timezone.utc).date().isoformat()
+    return (str(record_id), account, coin.lower(), day, stamp, float(amount))
+
+
+def key_of(api_key: str) -> str:
+    """Cursor key of an API key, so the key itself is not written to the file."""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:16]
+
+
+class EarningsStore:
+    """The SQLite file. Blocking, run its methods in an executor from the event loop."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._db = None
+        self._lock = threading.Lock()
+
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript(SCHEMA)
+        return self._db
+
+
+    def cursor(self, key: str, kind: str) -> Optional[int]:
+        """Time of the newest stored record of this kind fetched with `key`, None before the first sync."""
+        with self._lock:
+            row = self._connect().execute("SELECT time FROM cursors WHERE key = ? AND kind = ?", (key, kind)).fetchone()
+        return row[0] if row else None
+
+
+    def add(self, key: str, kind: str, records: Iterable[Record], cursor: int) -> int:
+        """Store the records and move the cursor, in one transaction. Returns the number of new records."""
+        with self._lock:
+            db = self._connect()
+            with db:
+                before = db.total_changes
+                db.executemany(
+                    "INSERT OR IGNORE INTO records (kind, id, account, coin, day, time, amount) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    ( (kind, ) + record for record in records )
+                )
+                added = db.total_changes - before
+                db.execute(
+                    "INSERT INTO cursors (key, kind, time) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key, kind) DO UPDATE SET time = max(time, excluded.time)",
+                    (key, kind, cursor)
+                )
+        return added
+
+
+    def revenue(self, today: date) -> Dict[Tuple[str, str], Dict[str, float]]:
+        """Amounts earned and paid out by (account, coin), for every pair with records since last month.
+
+        The queries are range scans of the (kind, day) index, which also holds
+        the account, coin and amount, so the table itself is not read.
+        """
+        month = today.replace(day=1)
+        bounds = {
+            "today": today.isoformat(),
+            "yesterday": (today - timedelta(days=1)).isoformat(),
+            "month": month.isoformat(),
+            "last_month": (month - timedelta(days=1)).replace(day=1).isoformat(),
+        }
+        result = {}
+
+        with self._lock:
+            db = self._connect()
+            for kind, columns in REVENUE_COLUMNS.items():
+                sums = ", ".join(f"SUM(CASE WHEN {condition} THEN amount ELSE 0.0 END)" for _, condition in columns)
+                rows = db.execute(
+                    f"SELECT account, coin, {sums} FROM records WHERE kind = :kind AND day >= :last_month GROUP BY account, coin",
+                    { **bounds, "kind": kind }
+                )
+                for account, coin, *amounts in rows:
+                    values = result.setdefault((account, coin), dict.fromkeys(REVENUE_FIELDS, 0.0))
+                    values.update(zip(( name for name, _ in columns ), ( round(amount, 8) for amount in amounts )))
+
+        return result
+
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+class EarningsSync:
+    """Pulls the new earnings and payouts of every API key into the store.
+
+    A sync runs at most once per `interval`, and right after midnight UTC so
+    the daily figures roll over. The first sync of an API key starts from
+    the first day of the previous month, not from the beginning of history.
+    """
+
+    PAGE_SIZE = 500
+    MAX_PAGES = 20
+
+    def __init__(self, store: EarningsStore, interval: timedelta, metrics: Metrics):
+        self.store = store
+        self.interval = interval
+        self.metrics = metrics
+        # (account, coin): amounts, see EarningsStore.revenue
+        self.revenue: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._synced: Optional[float] = None
+        self._day: Optional[date] = None
+
+
+    def due(self) -> bool:
+        return (
+            self._synced is None
+            or time.monotonic() - self._synced >= self.interval.total_seconds()
+            or datetime.now(timezone.utc).date() != self._day
+        )
+
+
+    async def async_sync_client(self, client, miners: set):
+        """Store the new records of one API key, limited to the `miners` accounts if given."""
+        loop = asyncio.get_running_loop()
+        key = key_of(client.API_KEY)
+        for kind in KINDS:
+            await self._async_sync_kind(loop, client, key, kind, miners)
+
+
+    async def async_load_revenue(self) -> bool:
+        """Reload the revenue after the clients synced. Returns True if it changed."""
+        today = datetime.now(timezone.utc).date()
+        self._synced = time.monotonic()
+        self._day = today
+
+        revenue = await asyncio.get_running_loop().run_in_executor(None, self.store.revenue, today)
+        changed = revenue != self.revenue
+        self.revenue = revenue
+        return changed
+
+
+    async def _async_sync_kind(self, loop, client, key: str, kind: str, miners: set):
+        cursor = await loop.run_in_executor(None, self.store.cursor, key, kind)
+        if cursor is None:
+            today = datetime.now(timezone.utc).date()
+            start = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+            cursor = int(datetime.combine(start, datetime.min.time(), timezone.utc).timestamp() * 1000)
+
+        fetch = client.get_earnings if kind == "earnings" else client.get_payouts
+
+        for _ in range(self.MAX_PAGES):
+            # the cursor is inclusive, records sharing its millisecond come
+            # again and are dropped by the primary key
+            page = await fetch(startTime=cursor, limit=self.PAGE_SIZE)
+            records = [ record for record in map(parse_record, page or []) if record is not None ]
+            newest = max(( record[4] for record in records ), default=cursor)
+
+            kept = [ record for record in records if not miners or record[1] in miners ]
+            added = await loop.run_in_executor(None, self.store.add, key, kind, kept, max(cursor, newest))
+            self.metrics.counter("earnings_records_total", "Earnings and payout records stored", kind=kind).inc(added)
+
+            # a full page within a single millisecond can't be paged past
+            if len(page or []) < self.PAGE_SIZE or newest <= cursor:
+                return
+            cursor = newest
+
+        _LOGGER.debug(f"More {kind} left at pool-api.sbicrypto.com, continuing with the next sync")
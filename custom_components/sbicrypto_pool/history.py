@@ -0,0 +1,131 @@
+"""
+In-memory hashrate history of the workers, for spotting degrading rigs
+"""
+import math
+from array import array
+from typing import Container, Dict, Iterable, List, Optional, Tuple
+
+
+class RingBuffer:
+    """Fixed size window of the last samples, with running mean and deviation.
+
+    The samples live in a preallocated float array, so a buffer never grows
+    past `size` values. The sum and the sum of squares are updated as
+    samples come in and drop out, keeping every push O(1).
+    """
+
+    __slots__ = ( "_values", "_pos", "count", "_sum", "_sumsq" )
+
+    def __init__(self, size: int):
+        self._values = array("f", bytes(4 * size))
+        self._pos = 0
+        self.count = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+
+    def push(self, value: float):
+        values = self._values
+
+        if self.count == len(values):
+            dropped = values[self._pos]
+            self._sum -= dropped
+            self._sumsq -= dropped * dropped
+        else:
+            self.count += 1
+
+        # stored as float32, so account for the value as stored
+        values[self._pos] = value
+        value = values[self._pos]
+        self._sum += value
+        self._sumsq += value * value
+        self._pos = (self._pos + 1) % len(values)
+
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self._sum / self.count if self.count else None
+
+
+    @property
+    def stdev(self) -> Optional[float]:
+        if not self.count:
+            return None
+        mean = self._sum / self.count
+        return math.sqrt(max(0.0, self._sumsq / self.count - mean * mean))
+
+
+    def __len__(self):
+        return self.count
+
+
+class HashrateHistory:
+    """Rolling 10 minutes hashrate history of every worker.
+
+    Each successful refresh adds one sample per worker. A worker is flagged
+    as degraded when its current hashrate is more than `drop` (a fraction)
+    below its own baseline, the mean of the samples before it. Workers need
+    `min_samples` samples before they are judged at all.
+    """
+
+    def __init__(self, size: int = 24, drop: float = 0.2, min_samples: Optional[int] = None):
+        self.size = size
+        self.drop = drop
+        self.min_samples = min_samples if min_samples is not None else max(1, size // 4)
+        self._buffers: Dict[Tuple[str, str], RingBuffer] = {}
+        self._baselines: Dict[Tuple[str, str], float] = {}
+        self.degraded: Dict[Tuple[str, str], float] = {}
+
+
+    def update(self, workers: Iterable, known: Optional[Container[Tuple[str, str]]] = None) -> List[Tuple[Tuple[str, str], bool]]:
+        """Add the samples of the given SBICryptoWorker records.
+
+        If `known` is given, the history of the workers not in it is
+        forgotten. Returns the ((account, worker), degraded) pairs of the
+        workers whose flag flipped with this update.
+        """
+        flipped = []
+
+        if known is not None:
+            for key in [ key for key in self._buffers if key not in known ]:
+                del self._buffers[key]
+                self._baselines.pop(key, None)
+                self.degraded.pop(key, None)
+
+        if not self.size:
+            return flipped
+
+        for worker in workers:
+            key = (worker.subaccount, worker.name)
+            buffer = self._buffers.get(key)
+            if buffer is None:
+                buffer = self._buffers[key] = RingBuffer(self.size)
+
+            if len(buffer) >= self.min_samples:
+                baseline = self._baselines[key] = buffer.mean
+                degraded = bool(self.drop) and worker.hrate10m < baseline * (1 - self.drop)
+
+                if degraded != (key in self.degraded):
+                    flipped.append((key, degraded))
+                if degraded:
+                    self.degraded[key] = worker.hrate10m
+                else:
+                    self.degraded.pop(key, None)
+
+            buffer.push(worker.hrate10m)
+
+        return flipped
+
+
+    def baseline(self, account: str, name: str) -> Optional[float]:
+        """Mean hashrate of the worker before the last sample, None while still learning."""
+        return self._baselines.get((account, name))
+
+
+    def stdev(self, account: str, name: str) -> Optional[float]:
+        buffer = self._buffers.get((account, name))
+        return buffer.stdev if buffer is not None else None
+
+
+    def is_degraded(self, account: str, name: str) -> bool:
+        return (account, name) in self.degraded
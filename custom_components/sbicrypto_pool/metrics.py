@@ -0,0 +1,129 @@
+"""
+Performance counters of the refresh pipeline
+"""
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+PREFIX = "sbicrypto_pool"
+
+
+class Counter:
+    __slots__ = ( "value", )
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Summary:
+    """Count, sum, last and largest of the observed values."""
+
+    __slots__ = ( "count", "total", "last", "maximum" )
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = None
+        self.maximum = None
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        self.last = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+
+class Metrics:
+    """Registry of the counters and summaries, rendered in the Prometheus text format.
+
+    Hot paths look their series up once and keep the returned object, so
+    recording a value is a plain attribute update.
+    """
+
+    def __init__(self):
+        self._counters: Dict[Tuple[str, Tuple], Counter] = {}
+        self._summaries: Dict[Tuple[str, Tuple], Summary] = {}
+        self._help: Dict[str, str] = {}
+
+
+    def counter(self, name: str, help: str = "", **labels) -> Counter:
+        key = (name, tuple(sorted(labels.items())))
+        series = self._counters.get(key)
+        if series is None:
+            series = self._counters[key] = Counter()
+            self._help.setdefault(name, help)
+        return series
+
+
+    def summary(self, name: str, help: str = "", **labels) -> Summary:
+        key = (name, tuple(sorted(labels.items())))
+        series = self._summaries.get(key)
+        if series is None:
+            series = self._summaries[key] = Summary()
+            self._help.setdefault(name, help)
+        return series
+
+
+    @contextmanager
+    def timer(self, name: str, help: str = "", **labels) -> Iterator[Summary]:
+        """Observe the wall time of the block, in seconds."""
+        series = self.summary(name, help, **labels)
+        start = time.perf_counter()
+        try:
+            yield series
+        finally:
+            series.observe(time.perf_counter() - start)
+
+
+    def render(self) -> str:
+        """Text exposition of every series, for a Prometheus scrape."""
+        lines = []
+
+        for name, series in self._grouped(self._counters):
+            lines.append(f"# HELP {PREFIX}_{name} {self._help.get(name) or name}")
+            lines.append(f"# TYPE {PREFIX}_{name} counter")
+            for labels, counter in series:
+                lines.append(f"{PREFIX}_{name}{_labels(labels)} {counter.value}")
+
+        for name, series in self._grouped(self._summaries):
+            lines.append(f"# HELP {PREFIX}_{name} {self._help.get(name) or name}")
+            lines.append(f"# TYPE {PREFIX}_{name} summary")
+            for labels, summary in series:
+                lines.append(f"{PREFIX}_{name}_sum{_labels(labels)} {summary.total}")
+                lines.append(f"{PREFIX}_{name}_count{_labels(labels)} {summary.count}")
+            lines.append(f"# TYPE {PREFIX}_{name}_last gauge")
+            for labels, summary in series:
+                if summary.last is not None:
+                    lines.append(f"{PREFIX}_{name}_last{_labels(labels)} {summary.last}")
+            lines.append(f"# TYPE {PREFIX}_{name}_max gauge")
+            for labels, summary in series:
+                if summary.maximum is not None:
+                    lines.append(f"{PREFIX}_{name}_max{_labels(labels)} {summary.maximum}")
+
+        return "\n".join(lines) + "\n"
+
+
+    @staticmethod
+    def _grouped(registry: Dict):
+        names = {}
+        for (name, labels), series in sorted(registry.items(), key=lambda item: item[0]):
+            names.setdefault(name, []).append((labels, series))
+        return names.items()
+
+
+def _labels(labels: Tuple) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + pairs + "}"
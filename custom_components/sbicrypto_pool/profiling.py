@@ -0,0 +1,92 @@
+"""
+Profile of one refresh cycle, taken on demand in the running instance
+"""
+import asyncio
+import cProfile
+import io
+import linecache
+import pstats
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Awaitable, Callable, Dict
+
+# frames of the tracing itself, left out of the allocations report
+IGNORED_FILES = ( tracemalloc.__file__, linecache.__file__, "<frozen importlib._bootstrap>", "<unknown>" )
+
+_lock = asyncio.Lock()
+
+
+class ProfilerBusyError(Exception):
+    """Raised when a profile is already being taken."""
+
+
+async def async_profile(refresh: Callable[[], Awaitable], path: Callable[[str], str], top: int = 25) -> Dict[str, str]:
+    """Run `refresh` under cProfile and tracemalloc and write the results next to `path("")`.
+
+    cProfile sees everything that runs on the event loop meanwhile, not
+    only the refresh; the work done in executor threads is not in it.
+    Returns the paths of the pstats file and of the text report.
+    """
+    if _lock.locked():
+        raise ProfilerBusyError("A refresh is already being profiled")
+
+    async with _lock:
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # another profiler (the profiler integration, a debugger) is active
+            if not tracing:
+                tracemalloc.stop()
+            raise ProfilerBusyError(str(e))
+
+        try:
+            await refresh()
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if not tracing:
+                tracemalloc.stop()
+
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    paths = {
+        "pstats": path(f"profile_{stamp}.pstats"),
+        "report": path(f"profile_{stamp}.txt"),
+    }
+    await asyncio.get_running_loop().run_in_executor(
+        None, _write, profiler, before, after, elapsed, peak, top, paths
+    )
+    return paths
+
+
+def _write(profiler: cProfile.Profile, before, after, elapsed: float, peak: int, top: int, paths: Dict[str, str]):
+    profiler.dump_stats(paths["pstats"])
+
+    filters = [ tracemalloc.Filter(False, name) for name in IGNORED_FILES ]
+    allocations = after.filter_traces(filters).compare_to(before.filter_traces(filters), "lineno")
+
+    report = io.StringIO()
+    report.write(f"Refresh profiled at {datetime.now().isoformat(timespec='seconds')}\n")
+    report.write(f"Wall time: {elapsed * 1000:.1f} ms\n")
+    report.write(f"Peak traced memory: {peak / 1048576:.1f} MiB\n")
+    report.write(f"Profile: {paths['pstats']}\n\n")
+
+    report.write(f"Top {top} allocations, by change in allocated size over the refresh:\n")
+    for stat in allocations[:top]:
+        report.write(f"{stat}\n")
+
+    report.write(f"\nTop {top} functions, by cumulative time:\n")
+    pstats.Stats(profiler, stream=report).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    with open(paths["report"], "w", encoding="utf-8") as file:
+        file.write(report.getvalue())
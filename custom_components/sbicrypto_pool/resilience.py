@@ -0,0 +1,93 @@
+"""
+Retry policy and circuit breaker for the SBICrypto pool API client
+"""
+import random
+import time
+from typing import Callable
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of a request while the circuit breaker is open."""
+
+    def __init__(self, retry_in: float):
+        self.retry_in = retry_in
+
+    def __str__(self):
+        return 'Pool API circuit is open, next probe in %.0fs' % self.retry_in
+
+
+class CircuitBreaker:
+    """Fails requests fast while the pool API is unhealthy.
+
+    After `failure_threshold` failed requests in a row the circuit opens and
+    every request is rejected for `reset_timeout` seconds. Then it turns
+    half-open and lets a single probe through: if the probe succeeds the
+    circuit closes again, otherwise it stays open for another period.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+
+
+    def before_request(self):
+        """Raise CircuitOpenError unless a request may go out now."""
+        if self.state == self.CLOSED:
+            return
+
+        if self.state == self.OPEN:
+            retry_in = self._opened_at + self.reset_timeout - self._clock()
+            if retry_in > 0:
+                raise CircuitOpenError(retry_in)
+            self.state = self.HALF_OPEN
+            self._probing = False
+
+        # half-open: only one probe at a time
+        if self._probing:
+            raise CircuitOpenError(0)
+        self._probing = True
+
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self._opened_at = self._clock()
+
+
+    def release(self):
+        """Forget a request that ended without telling anything about the API health."""
+        self._probing = False
+
+
+class RetryPolicy:
+    """Bounded retries with jittered exponential delays inside a time budget."""
+
+    def __init__(self, attempts: int = 3, backoff: float = 0.5, max_backoff: float = 4, budget: float = 45):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before retry number `attempt` (1-based)."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return delay / 2 + delay / 2 * random.random()
@@ -0,0 +1,65 @@
+"""
+Fleet rollup statistics for the SBICrypto aggregate sensors
+"""
+import heapq
+from typing import Dict, Iterable
+
+from . import WORKER_STATES
+
+HISTOGRAM_BINS = 10
+
+# long name lists would blow up the state attributes (and the recorder rows)
+LIST_LIMIT = 50
+
+
+def summarize(workers: Iterable, top: int = 5, bins: int = HISTOGRAM_BINS) -> Dict:
+    """Summarize a group of SBICryptoWorker records in one pass.
+
+    Returns the state counts, the total hashrates, the `top` slowest and
+    fastest online workers (by 10 minutes hashrate), a histogram of the
+    online workers' 10 minutes hashrate and the names of the offline and
+    dead workers.
+    """
+    counts = { "ONLINE": 0, "OFFLINE": 0, "DEAD": 0, "UNKNOWN": 0 }
+    total = [ 0, 0, 0 ]
+    count = 0
+    online = []
+    offline = []
+    dead = []
+
+    for worker in workers:
+        state = WORKER_STATES.get(worker.state)
+        if state is not None:
+            counts[state] += 1
+
+        count += 1
+        total[0] += worker.hrate10m
+        total[1] += worker.hrate1h
+        total[2] += worker.hrate24h
+
+        if state == "ONLINE":
+            online.append((worker.hrate10m, f"{worker.subaccount}.{worker.name}"))
+        elif state == "OFFLINE" and len(offline) < LIST_LIMIT:
+            offline.append(f"{worker.subaccount}.{worker.name}")
+        elif state == "DEAD" and len(dead) < LIST_LIMIT:
+            dead.append(f"{worker.subaccount}.{worker.name}")
+
+    histogram = { "bin_width": 0, "counts": [] }
+    if online:
+        peak = max(hashrate for hashrate, _ in online)
+        width = peak / bins if peak else 1
+        buckets = [ 0 ] * bins
+        for hashrate, _ in online:
+            buckets[min(bins - 1, int(hashrate / width))] += 1
+        histogram = { "bin_width": round(width), "counts": buckets }
+
+    return {
+        "workerStatus": counts,
+        "numOfWorkers": count,
+        "hashrate": total,
+        "slowest": [ { "worker": name, "hashrate": hashrate } for hashrate, name in heapq.nsmallest(top, online) ],
+        "fastest": [ { "worker": name, "hashrate": hashrate } for hashrate, name in heapq.nlargest(top, online) ],
+        "histogram": histogram,
+        "offline": sorted(offline),
+        "dead": sorted(dead),
+    }
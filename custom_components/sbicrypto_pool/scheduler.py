@@ -0,0 +1,52 @@
+"""
+Adaptive refresh interval for the SBICrypto coordinator
+"""
+import random
+from datetime import timedelta
+from typing import Optional
+
+
+class AdaptiveInterval:
+    """Picks the delay until the next refresh from the outcome of the last one.
+
+    - after a failure the delay grows exponentially (with jitter, so several
+      instances do not retry in lockstep) up to `max_backoff`, and never
+      gets shorter than a Retry-After sent by the server;
+    - after a refresh in which worker states changed the delay drops to
+      `fast_interval`, then doubles back to `interval` while things are calm.
+    """
+
+    def __init__(self, interval: timedelta, fast_interval: timedelta, max_backoff: timedelta):
+        self.interval = interval
+        self.fast_interval = min(fast_interval, interval)
+        self.max_backoff = max(max_backoff, interval)
+        self.failures = 0
+        self.current = interval
+
+
+    def success(self, changed: bool = False) -> timedelta:
+        self.failures = 0
+
+        if changed:
+            self.current = self.fast_interval
+        else:
+            self.current = min(self.interval, self.current * 2)
+
+        return self.current
+
+
+    def failure(self, retry_after: Optional[float] = None) -> timedelta:
+        self.failures += 1
+        self.current = self.interval
+        return self.backoff(self.failures, retry_after)
+
+
+    def backoff(self, failures: int, retry_after: Optional[float] = None) -> timedelta:
+        """Delay after `failures` failures in a row, without changing the state."""
+        backoff = min(self.max_backoff, self.interval * 2 ** min(failures, 16))
+        backoff = backoff / 2 + backoff / 2 * random.random()
+
+        if retry_after is not None:
+            backoff = max(backoff, timedelta(seconds=retry_after))
+
+        return backoff
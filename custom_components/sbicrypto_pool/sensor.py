@@ -1,10 +1,16 @@
 """
 SBICrypto sensor
 """
-from datetime import datetime, timezone
+import time
+from datetime import datetime
 
 from homeassistant.const import ATTR_ATTRIBUTION
 from homeassistant.components.sensor import SensorEntity
+from homeassistant.core import callback
+from homeassistant.helpers.entity import EntityCategory
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .rollup import summarize
 
 ATTRIBUTION = "Data provided by SBICrypto"
 
@@ -12,6 +18,8 @@ ATTR_WORKER_STATUS = "status"
 ATTR_WORKER_REJECT = "reject_rate"
 ATTR_WORKER_WORKER = "worker_name"
 ATTR_WORKER_UPDATE = "updated"
+ATTR_WORKER_BASELINE = "baseline hashrate (10 mins)"
+ATTR_WORKER_DEGRADED = "hashrate degraded"
 
 ATTR_STATUS_HRATE10M = "average hashrate (10 mins)"
 ATTR_STATUS_HRATE1H = "average hashrate (1 hour)"
@@ -22,61 +30,209 @@ ATTR_STATUS_INVALID_WORKERS = "invalid workers"
 ATTR_STATUS_INACTIVE_WORKERS = "inactive workers"
 ATTR_STATUS_UNKNOWN_WORKERS = "unknown workers"
 ATTR_STATUS_TOTAL_ALERTS = "All workers with alerts"
+ATTR_STATUS_MEDIAN10M = "median hashrate (10 mins)"
+ATTR_STATUS_P5_10M = "5th percentile hashrate (10 mins)"
+ATTR_STATUS_P95_10M = "95th percentile hashrate (10 mins)"
+
+ATTR_ROLLUP_HRATE10M = "total hashrate (10 mins)"
+ATTR_ROLLUP_HRATE1H = "total hashrate (1 hour)"
+ATTR_ROLLUP_HRATE24H = "total hashrate (24 hours)"
+ATTR_ROLLUP_SLOWEST = "slowest workers"
+ATTR_ROLLUP_FASTEST = "fastest workers"
+ATTR_ROLLUP_HISTOGRAM = "hashrate histogram"
+ATTR_ROLLUP_OFFLINE = "offline workers"
+ATTR_ROLLUP_DEAD = "dead workers"
+ATTR_ROLLUP_ACCOUNTS = "accounts"
+
+ATTR_REVENUE_YESTERDAY = "yesterday"
+ATTR_REVENUE_LAST_MONTH = "last month"
+ATTR_REVENUE_PAID = "paid out this month"
+ATTR_REVENUE_PAID_LAST_MONTH = "paid out last month"
 
 ATTR_ACCOUNT = "account"
 ATTR_COIN = "coin"
 
 DATA_SBICRYPTO = "sbicrypto_pool_cache"
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+ATTR_METRIC_COUNT = "count"
+ATTR_METRIC_MEAN = "mean"
+ATTR_METRIC_MAX = "max"
+
+# name, metric, labels, unit (ms and KiB are converted from seconds and bytes)
+DIAGNOSTICS = (
+    ( "refresh duration", "refresh_seconds", {}, "ms" ),
+    ( "account latency", "http_request_seconds", { "endpoint": "account" }, "ms" ),
+    ( "workers latency", "http_request_seconds", { "endpoint": "workers" }, "ms" ),
+    ( "workers payload", "http_response_bytes", { "endpoint": "workers" }, "KiB" ),
+    ( "workers decode time", "json_decode_seconds", { "endpoint": "workers" }, "ms" ),
+    ( "aggregation time", "aggregation_seconds", { "stage": "workers" }, "ms" ),
+    ( "sensor updates time", "listeners_seconds", {}, "ms" ),
+)
+SCALES = { "ms": 1000, "KiB": 1 / 1024 }
+
+# period: revenue figure shown as the state, attributes with the figures behind it
+REVENUE_PERIODS = {
+    "daily": ( "today", { ATTR_REVENUE_YESTERDAY: "yesterday" } ),
+    "monthly": ( "month", { 
+        ATTR_REVENUE_LAST_MONTH: "last_month", 
+        ATTR_REVENUE_PAID: "paid_month", 
+        ATTR_REVENUE_PAID_LAST_MONTH: "paid_last_month" 
+    } ),
+}
+
+
+def within_deadband(old, new, deadband: float) -> bool:
+    """Whether a hashrate moved less than the relative deadband from the published value."""
+    if old == new:
+        return True
+    if not deadband or old is None or new is None:
+        return False
+    return abs(new - old) <= deadband * abs(old)
+
+
+async def async_setup_platform(hass, config, async_add_entities, discovery_info=None):
     """Setup the SBICrypto sensors."""
 
     if discovery_info is None:
         return
     
-    elif all(i in discovery_info for i in ["prefix", "name", "state", "lastShareTime", "subaccountId", "subaccount", "hashrates"]):
-        prefix = discovery_info["prefix"]
-        name = discovery_info["name"]
-        state = discovery_info["state"]
-        lastShareTime = discovery_info["lastShareTime"]
-        subaccountId = discovery_info["subaccountId"]
-        subaccount = discovery_info["subaccount"]
-        hashrates = discovery_info["hashrates"]
-
-        sensor = SBICryptoWorkerSensor(hass.data[DATA_SBICRYPTO], prefix, name, state, lastShareTime, subaccountId, subaccount, hashrates)
-
-    elif all(i in discovery_info for i in ["prefix", "name", "coin", "workerStatus", "numOfWorkers", "hashrate"]):
-        prefix = discovery_info["prefix"]
-        name = discovery_info["name"]
-        coin = discovery_info["coin"]
-        workerStatus = discovery_info["workerStatus"]
-        numOfWorkers = discovery_info["numOfWorkers"]
-        hashrate = discovery_info["hashrate"]
-
-        sensor = SBICryptoStatusSensor(hass.data[DATA_SBICRYPTO], prefix, name, coin, workerStatus, numOfWorkers, hashrate)
+    coordinator = hass.data[DATA_SBICRYPTO]
+    prefix = discovery_info["prefix"]
+    deadband = discovery_info.get("hashrate_deadband", 0)
+    rollup = discovery_info.get("rollup", False)
+    top = discovery_info.get("rollup_top", 5)
+    # in rollup mode only the explicitly listed workers ("account.worker") get own sensors
+    listed = { tuple(worker.split(".", 1)) for worker in discovery_info.get("workers", []) }
+    sensors = {}
+
+    @callback
+    def async_sync_sensors():
+        """Add sensors for new workers and accounts, remove the ones that vanished."""
+        sbicrypto_data = coordinator.sbicrypto_data
+        
+        current = { 
+            ("worker", ) + key: worker for key, worker in sbicrypto_data.workers_index.items() 
+            if not rollup or key in listed
+        }
+        current.update({ 
+            ("status", account): status for account, status in sbicrypto_data.accounts_index.items() 
+        })
+        
+        if rollup:
+            current.update({ ("rollup", account): account for account in sbicrypto_data.accounts_index })
+            current.update({ ("coin", coin): coin for coin in sbicrypto_data.coins_index })
+            
+        current.update({ 
+            ("revenue", period) + key: key for key in sbicrypto_data.revenue for period in REVENUE_PERIODS 
+        })
+        
+        for key in sensors.keys() - current.keys():
+            hass.async_create_task(sensors.pop(key).async_remove())
+
+        new_sensors = []
         
-    add_entities([sensor], True)
+        for key in current.keys() - sensors.keys():
+            record = current[key]
+            
+            if key[0] == "worker":
+                sensor = SBICryptoWorkerSensor(coordinator, prefix, record, deadband)
+            elif key[0] in ("rollup", "coin"):
+                sensor = SBICryptoRollupSensor(coordinator, prefix, key[0], record, top)
+            elif key[0] == "revenue":
+                sensor = SBICryptoRevenueSensor(coordinator, prefix, key[1], *record)
+            else:
+                sensor = SBICryptoStatusSensor(
+                    coordinator, prefix, record["name"], record["coin"], record["workerStatus"], 
+                    record["numOfWorkers"], record["hashrate"], deadband, record.get("statistics")
+                )
+                
+            sensors[key] = sensor
+            new_sensors.append(sensor)
+
+        if new_sensors:
+            async_add_entities(new_sensors)
+
+    async_add_entities([ 
+        SBICryptoMetricSensor(coordinator, prefix, name, metric, labels, unit) 
+        for name, metric, labels, unit in DIAGNOSTICS 
+    ])
+
+    async_sync_sensors()
+    coordinator.async_add_listener(async_sync_sensors)
+
+
+class SBICryptoEntity(CoordinatorEntity):
+    """Coordinator entity that writes its state only when its values changed."""
+
+    METRICS_KIND = "sensor"
+
+    def __init__(self, coordinator):
+        super().__init__(coordinator)
+        metrics = coordinator.sbicrypto_data.metrics
+        self._written = metrics.counter("sensor_updates_total", "Sensor updates by outcome", kind=self.METRICS_KIND, result="written")
+        self._skipped = metrics.counter("sensor_updates_total", "Sensor updates by outcome", kind=self.METRICS_KIND, result="skipped")
+        self._timing = metrics.summary("sensor_update_seconds", "Time spent in the sensor updates", kind=self.METRICS_KIND)
+        
+        
+    async def async_added_to_hass(self):
+        """Catch up with a refresh that may have landed before the entity was added."""
+        await super().async_added_to_hass()
+        self._update_from_data(self.coordinator.sbicrypto_data)
+        self._available = self.available
+
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Take the values from the refreshed snapshot, write the state only if it changed."""
+        start = time.perf_counter()
+        sbicrypto_data = self.coordinator.sbicrypto_data
+        # accounts that did not change since the last refresh need no look,
+        # unless the refresh is being profiled and every sensor has to update
+        changed = (sbicrypto_data.force_update or self._affected_by(sbicrypto_data)) and self._update_from_data(sbicrypto_data)
+        
+        if changed or self._available != self.available:
+            self._available = self.available
+            self.async_write_ha_state()
+            self._written.inc()
+        else:
+            self._skipped.inc()
+            
+        self._timing.observe(time.perf_counter() - start)
+
+
+    def _affected_by(self, sbicrypto_data) -> bool:
+        """Whether the last refresh may have changed the values of this sensor."""
+        return True
+
 
-            
-class SBICryptoWorkerSensor(SensorEntity):
+    def _update_from_data(self, sbicrypto_data) -> bool:
+        """Take the values of this sensor from the snapshot. Returns True if they changed."""
+        return False
+
+
+class SBICryptoWorkerSensor(SBICryptoEntity, SensorEntity):
     """Representation of a Sensor."""
 
-    def __init__(self, sbicrypto_data, prefix, name, state, lastShareTime, subaccountId, subaccount, hashrates):
+    METRICS_KIND = "worker"
+
+    STATUS_VARS = { "UNKNOWN": "unknown", "ONLINE": "valid", "DEAD": "invalid", "OFFLINE": "inactive" }
+    STATUS_ICONS = { "UNKNOWN": "mdi:sync-off", "ONLINE": "mdi:server-network", "DEAD": "mdi:server-network-off", "OFFLINE": "mdi:power-plug-off" }
+
+    def __init__(self, coordinator, prefix, worker, deadband = 0):
         """Initialize the sensor."""
-        self._sbicrypto_data = sbicrypto_data
-        self._name = f"{prefix} {subaccount}.{name} worker"
-        self._account = subaccount
-        self._worker = name
-        self._status = state
-        self._hrate10m = hashrates[0]
-        self._hrate1h = hashrates[1]
-        self._hrate24h = hashrates[2]
-        self._update = lastShareTime
+        super().__init__(coordinator)
+        self._deadband = deadband
+        self._name = f"{prefix} {worker.subaccount}.{worker.name} worker"
+        self._account = worker.subaccount
+        self._worker = worker.name
+        self._record = worker
         self._unit_of_measurement = "H/s"        
-        self._state = None
+        self._state = worker.hrate10m
+        self._baseline = None
+        self._degraded = False
         
-        self._status_vars = { "UNKNOWN": "unknown", "ONLINE": "valid", "DEAD": "invalid", "OFFLINE": "inactive" }
-        self._status_icons = { "UNKNOWN": "mdi:sync-off", "ONLINE": "mdi:server-network", "DEAD": "mdi:server-network-off", "OFFLINE": "mdi:power-plug-off" }
+        self._attributes = self._build_attributes()
+        self._available = None
 
     @property
     def name(self):
@@ -99,74 +255,86 @@ class SBICryptoWorkerSensor(SensorEntity):
         """Icon to use in the frontend, if any."""
         
         try:
-            return self._status_icons[self._status]
-        except KeyError as e:
-            return self._status_icons[0]
+            return self.STATUS_ICONS[self._record.state]
+        except KeyError:
+            return self.STATUS_ICONS["UNKNOWN"]
 
     @property
     def extra_state_attributes(self):
         """Return the state attributes of the sensor."""
+        return self._attributes
+
 
+    def _build_attributes(self):
+        worker = self._record
+        
         data = {
             ATTR_ATTRIBUTION: ATTRIBUTION,
-            ATTR_STATUS_HRATE10M: float(self._hrate10m),
-            ATTR_STATUS_HRATE1H: float(self._hrate1h),            
-            ATTR_STATUS_HRATE24H: float(self._hrate24h),
+            ATTR_STATUS_HRATE10M: float(worker.hrate10m),
+            ATTR_STATUS_HRATE1H: float(worker.hrate1h),            
+            ATTR_STATUS_HRATE24H: float(worker.hrate24h),
             ATTR_WORKER_WORKER: f"{self._worker}",
-            ATTR_WORKER_UPDATE: datetime.fromisoformat(self._update),
-            ATTR_ACCOUNT: f"{self._account}"
+            ATTR_WORKER_UPDATE: datetime.fromisoformat(worker.last_share_time),
+            ATTR_ACCOUNT: f"{self._account}",
+            ATTR_WORKER_DEGRADED: self._degraded,
         }
         
+        if self._baseline is not None:
+            data[ATTR_WORKER_BASELINE] = round(self._baseline)
+        
         try:
-            data[ATTR_WORKER_STATUS] = self._status_vars[self._status]
-        except KeyError as e:
+            data[ATTR_WORKER_STATUS] = self.STATUS_VARS[worker.state]
+        except KeyError:
             data[ATTR_WORKER_STATUS] = "unknown"
         
         return data
+
+
+    def _affected_by(self, sbicrypto_data) -> bool:
+        return self._account in sbicrypto_data.changed_accounts
+
+
+    def _update_from_data(self, sbicrypto_data) -> bool:
+        """Update current values. Returns True if anything worth a state write changed."""
+
+        worker = sbicrypto_data.get_worker(self._account, self._worker)
         
+        if worker is None:
+            changed = self._state is not None
+            self._state = None 
+            return changed
+            
+        published = self._record
+        degraded = sbicrypto_data.history.is_degraded(self._account, self._worker)
         
-    def update(self):
-        """Update current values."""
-        self._sbicrypto_data.update()
-
-        exists = False
-                
-        for account, type in self._sbicrypto_data.mining["accounts"].items():
-            if account != self._account:
-                continue
-                
-            if "workers" not in type:
-                continue
-                
-            for worker in type["workers"]:
-                if worker["name"] != self._worker:
-                    continue
-                
-                exists = True
-                    
-                self._account = worker["subaccount"]
-                self._worker = worker["name"]
-                self._status = worker["state"]
-                self._hrate10m = worker["hashrates"][0]
-                self._hrate1h = worker["hashrates"][1]
-                self._hrate24h = worker["hashrates"][2]                    
-
-                self._state = self._hrate10m
-
-                break                
+        if (
+            self._state is not None
+            and degraded == self._degraded
+            and worker.state == published.state
+            and within_deadband(published.hrate10m, worker.hrate10m, self._deadband)
+            and within_deadband(published.hrate1h, worker.hrate1h, self._deadband)
+            and within_deadband(published.hrate24h, worker.hrate24h, self._deadband)
+        ):
+            return False
             
-            if exists:
-                break
-                            
-        if not exists:
-            self._state = None 
+        self._record = worker
+        self._state = worker.hrate10m
+        self._degraded = degraded
+        self._baseline = sbicrypto_data.history.baseline(self._account, self._worker)
+        self._attributes = self._build_attributes()
+        return True
+
             
-class SBICryptoStatusSensor(SensorEntity):
+class SBICryptoStatusSensor(SBICryptoEntity, SensorEntity):
     """Representation of a Sensor."""
 
-    def __init__(self, sbicrypto_data, prefix, name, coin, workerStatus, numOfWorkers, hashrate):
+    METRICS_KIND = "status"
+
+    def __init__(self, coordinator, prefix, name, coin, workerStatus, numOfWorkers, hashrate, deadband = 0, statistics = None):
         """Initialize the sensor."""
-        self._sbicrypto_data = sbicrypto_data
+        super().__init__(coordinator)
+        self._deadband = deadband
+        self._statistics = statistics or {}
         self._name = f"{prefix} {name} status"
         self._account = name
         self._coin = coin
@@ -180,7 +348,11 @@ class SBICryptoStatusSensor(SensorEntity):
         self._inactive_workers = int(workerStatus["OFFLINE"])
         self._total_alerts = int(self._unknown_workers + self._invalid_workers + self._inactive_workers)
         self._unit_of_measurement = "H/s"        
-        self._state = None
+        self._state = self._hrate10m
+        self._missing = False
+        
+        self._attributes = self._build_attributes()
+        self._available = None
     
     @property
     def name(self):
@@ -206,8 +378,11 @@ class SBICryptoStatusSensor(SensorEntity):
     @property
     def extra_state_attributes(self):
         """Return the state attributes of the sensor."""
+        return self._attributes
 
-        return {
+
+    def _build_attributes(self):
+        data = {
             ATTR_ATTRIBUTION: ATTRIBUTION,
             ATTR_STATUS_HRATE10M: f"{self._hrate10m}",
             ATTR_STATUS_HRATE1H: f"{self._hrate1h}",            
@@ -222,37 +397,296 @@ class SBICryptoStatusSensor(SensorEntity):
             ATTR_COIN: f"{self._coin}".upper(),
         }
         
+        if self._statistics:
+            data[ATTR_STATUS_MEDIAN10M] = f"{round(self._statistics['median'][0])}"
+            data[ATTR_STATUS_P5_10M] = f"{round(self._statistics['p5'][0])}"
+            data[ATTR_STATUS_P95_10M] = f"{round(self._statistics['p95'][0])}"
+            
+        return data
+
+
+    def _affected_by(self, sbicrypto_data) -> bool:
+        return self._account in sbicrypto_data.changed_accounts
+
+
+    def _update_from_data(self, sbicrypto_data) -> bool:
+        """Update current values. Returns True if anything worth a state write changed."""
+
+        status = sbicrypto_data.get_account_status(self._account)
+
+        if status is None:
+            changed = not self._missing
+            self._missing = True
+            self._state = 0
+            return changed
+            
+        hashrate = status["hashrate"]
+        workerStatus = status["workerStatus"]
+        
+        if (
+            not self._missing
+            and status["coin"] == self._coin
+            and status["numOfWorkers"] == self._total_workers
+            and workerStatus["ONLINE"] == self._valid_workers
+            and workerStatus["UNKNOWN"] == self._unknown_workers
+            and workerStatus["DEAD"] == self._invalid_workers
+            and workerStatus["OFFLINE"] == self._inactive_workers
+            and within_deadband(self._hrate10m, hashrate[0], self._deadband)
+            and within_deadband(self._hrate1h, hashrate[1], self._deadband)
+            and within_deadband(self._hrate24h, hashrate[2], self._deadband)
+        ):
+            return False
+            
+        self._coin = status["coin"]
+        self._hrate10m = hashrate[0]
+        self._hrate1h = hashrate[1]
+        self._hrate24h = hashrate[2]
+        self._total_workers = status["numOfWorkers"]
+        self._valid_workers = workerStatus["ONLINE"]
+        self._unknown_workers = workerStatus["UNKNOWN"]
+        self._invalid_workers = workerStatus["DEAD"]
+        self._inactive_workers = workerStatus["OFFLINE"]
+        self._total_alerts = self._unknown_workers + self._invalid_workers + self._inactive_workers
+        self._statistics = status.get("statistics", {})
         
-    def update(self):
-        """Update current values."""
-        self._sbicrypto_data.update()
+        self._missing = False
+        self._state = float(self._hrate10m)
+        self._attributes = self._build_attributes()
+        return True
 
-        exists = False
 
-        for account, type in self._sbicrypto_data.mining["accounts"].items():
-            if account != self._account:
-                continue
-                
-            if "status" not in type:
-                continue
+class SBICryptoRollupSensor(SBICryptoEntity, SensorEntity):
+    """Aggregate of the workers of one account, or of all the accounts mining one coin."""
+
+    METRICS_KIND = "rollup"
 
-            exists = True
+    def __init__(self, coordinator, prefix, kind, key, top = 5):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._kind = kind
+        self._key = key
+        self._top = top
+        self._name = f"{prefix} {key} rollup" if kind == "rollup" else f"{prefix} {key.upper()} rollup"
+        self._unit_of_measurement = "H/s"        
+        self._coin = key
+        self._state = None
+        self._attributes = {}
+        self._available = None
+        self._covered = set()
+        
+        self._update_from_data(coordinator.sbicrypto_data)
+    
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement this sensor expresses itself in."""
+        return self._unit_of_measurement
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return f"mdi:currency-{self._coin}" 
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes of the sensor."""
+        return self._attributes
+
+
+    def _affected_by(self, sbicrypto_data) -> bool:
+        changed = sbicrypto_data.changed_accounts
+        if self._kind == "rollup":
+            return self._key in changed
+        # a coin sensor also has to drop the accounts that moved to another coin
+        return not changed.isdisjoint(self._covered) or not changed.isdisjoint(sbicrypto_data.coins_index.get(self._key, []))
+
+
+    def _update_from_data(self, sbicrypto_data) -> bool:
+        """Update current values. Returns True if anything changed."""
+        
+        if self._kind == "rollup":
+            accounts = [ self._key ]
+            status = sbicrypto_data.get_account_status(self._key)
+            if status is not None:
+                self._coin = status["coin"]
+        else:
+            accounts = sbicrypto_data.coins_index.get(self._key, [])
+        self._covered = set(accounts)
+
+        summary = summarize(
+            (worker for account in accounts for worker in sbicrypto_data.get_account_workers(account)), 
+            self._top
+        )
+        
+        attributes = {
+            ATTR_ATTRIBUTION: ATTRIBUTION,
+            ATTR_ROLLUP_HRATE10M: summary["hashrate"][0],
+            ATTR_ROLLUP_HRATE1H: summary["hashrate"][1],
+            ATTR_ROLLUP_HRATE24H: summary["hashrate"][2],
+            ATTR_STATUS_TOTAL_WORKERS: summary["numOfWorkers"],
+            ATTR_STATUS_VALID_WORKERS: summary["workerStatus"]["ONLINE"],
+            ATTR_STATUS_UNKNOWN_WORKERS: summary["workerStatus"]["UNKNOWN"],
+            ATTR_STATUS_INVALID_WORKERS: summary["workerStatus"]["DEAD"],
+            ATTR_STATUS_INACTIVE_WORKERS: summary["workerStatus"]["OFFLINE"],
+            ATTR_ROLLUP_SLOWEST: summary["slowest"],
+            ATTR_ROLLUP_FASTEST: summary["fastest"],
+            ATTR_ROLLUP_HISTOGRAM: summary["histogram"],
+            ATTR_ROLLUP_OFFLINE: summary["offline"],
+            ATTR_ROLLUP_DEAD: summary["dead"],
+            ATTR_COIN: f"{self._coin}".upper(),
+        }
+        if self._kind == "rollup":
+            attributes[ATTR_ACCOUNT] = self._key
+        else:
+            attributes[ATTR_ROLLUP_ACCOUNTS] = sorted(accounts)
             
-            self._coin = type["status"]["coin"]
-            self._hrate10m = type["status"]["hashrate"][0]
-            self._hrate1h = type["status"]["hashrate"][1]
-            self._hrate24h = type["status"]["hashrate"][2]
-            self._total_workers = type["status"]["numOfWorkers"]
-            self._valid_workers = type["status"]["workerStatus"]["ONLINE"]
-            self._unknown_workers = type["status"]["workerStatus"]["UNKNOWN"]
-            self._invalid_workers = type["status"]["workerStatus"]["DEAD"]
-            self._inactive_workers = type["status"]["workerStatus"]["OFFLINE"]
-            self._total_alerts = self._unknown_workers + self._invalid_workers + self._inactive_workers
+        state = summary["hashrate"][0]
+        
+        if state == self._state and attributes == self._attributes:
+            return False
             
-            self._state = float(self._hrate10m)
+        self._state = state
+        self._attributes = attributes
+        return True
+
+
+class SBICryptoRevenueSensor(SBICryptoEntity, SensorEntity):
+    """Daily or monthly earnings of one account in one coin, from the earnings database."""
+
+    METRICS_KIND = "revenue"
+
+    def __init__(self, coordinator, prefix, period, account, coin):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._period = period
+        self._account = account
+        self._coin = coin
+        self._name = f"{prefix} {account} {coin.upper()} {period} revenue"
+        self._state = None
+        self._attributes = {}
+        self._available = None
+        
+        self._update_from_data(coordinator.sbicrypto_data)
+    
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+
+        return self._state
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement this sensor expresses itself in."""
+        return self._coin.upper()
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return f"mdi:currency-{self._coin}" 
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes of the sensor."""
+        return self._attributes
+
+
+    def _affected_by(self, sbicrypto_data) -> bool:
+        return sbicrypto_data.revenue_changed
+
+
+    def _update_from_data(self, sbicrypto_data) -> bool:
+        """Update current values. Returns True if anything changed."""
+        
+        revenue = sbicrypto_data.revenue.get((self._account, self._coin))
+        if revenue is None:
+            changed = self._state is not None
+            self._state = None
+            return changed
             
-            break
-                
-        if not exists:
-            self._state = 0
+        field, extra = REVENUE_PERIODS[self._period]
+        state = revenue[field]
+        attributes = {
+            ATTR_ATTRIBUTION: ATTRIBUTION,
+            ATTR_ACCOUNT: self._account,
+            ATTR_COIN: self._coin.upper(),
+        }
+        attributes.update({ name: revenue[key] for name, key in extra.items() })
+        
+        if state == self._state and attributes == self._attributes:
+            return False
             
+        self._state = state
+        self._attributes = attributes
+        return True
+
+
+class SBICryptoMetricSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor showing the last value of one of the refresh metrics."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator, prefix, name, metric, labels, unit):
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self._name = f"{prefix} {name}"
+        self._summary = coordinator.sbicrypto_data.metrics.summary(metric, **labels)
+        self._scale = SCALES.get(unit, 1)
+        self._unit_of_measurement = unit
+
+    async def async_added_to_hass(self):
+        """Follow every refresh, also the ones that left the mining data as it was."""
+        await super().async_added_to_hass()
+        self.async_on_remove(self.coordinator.async_add_diagnostic_listener(self._handle_coordinator_update))
+
+    @property
+    def name(self):
+        """Return the name of the sensor."""
+        return self._name
+
+    @property
+    def state(self):
+        """Return the state of the sensor."""
+        return self._scaled(self._summary.last)
+
+    @property
+    def unit_of_measurement(self):
+        """Return the unit of measurement this sensor expresses itself in."""
+        return self._unit_of_measurement
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend, if any."""
+        return "mdi:timer-outline" if self._unit_of_measurement == "ms" else "mdi:download-network"
+
+    @property
+    def available(self):
+        """The metrics stay valid when a refresh fails."""
+        return True
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes of the sensor."""
+        return {
+            ATTR_METRIC_COUNT: self._summary.count,
+            ATTR_METRIC_MEAN: self._scaled(self._summary.mean),
+            ATTR_METRIC_MAX: self._scaled(self._summary.maximum),
+        }
+
+
+    def _scaled(self, value):
+        return None if value is None else round(value * self._scale, 1)
@@ -0,0 +1,55 @@
+"""
+Split of the pool accounts into shards refreshed one after the other
+"""
+from typing import Dict, Iterable, Set
+
+
+class ShardPlan:
+    """Spreads the accounts over `count` shards, refreshed in turn.
+
+    Each refresh processes the accounts of the current shard only, so a
+    refresh every interval / count keeps every account at most one interval
+    old. An account keeps its shard for as long as it exists, which is what
+    makes that bound hold; new accounts are processed on the refresh that
+    finds them, then placed, largest first, on the shard with the fewest
+    workers.
+    """
+
+    def __init__(self, count: int = 1):
+        self.count = max(1, count)
+        self.current = 0
+        self._shards: Dict[str, int] = {}
+        self._sizes: Dict[str, int] = {}
+
+
+    def others(self) -> Set[str]:
+        """The accounts that belong to another shard than the current one."""
+        if self.count == 1:
+            return set()
+        current = self.current
+        return { name for name, shard in self._shards.items() if shard != current }
+
+
+    def update(self, accounts: Iterable[str], sizes: Dict[str, int]):
+        """Forget the accounts that are gone, record the worker counts and place the new accounts."""
+        accounts = set(accounts)
+
+        for name in self._shards.keys() - accounts:
+            del self._shards[name]
+        for name in self._sizes.keys() - accounts:
+            del self._sizes[name]
+        self._sizes.update((name, size) for name, size in sizes.items() if name in accounts)
+
+        load = [ 0 ] * self.count
+        for name, shard in self._shards.items():
+            load[shard] += self._sizes.get(name, 0)
+
+        for name in sorted(accounts - self._shards.keys(), key=lambda name: (-self._sizes.get(name, 0), name)):
+            shard = min(range(self.count), key=load.__getitem__)
+            self._shards[name] = shard
+            load[shard] += self._sizes.get(name, 0)
+
+
+    def advance(self):
+        self.current = (self.current + 1) % self.count
+
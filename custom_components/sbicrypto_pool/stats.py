@@ -0,0 +1,147 @@
+"""
+Hashrate statistics of the pool accounts
+
+The hashrates of all the workers are loaded into one (workers x 3) array,
+one column per averaging window (10 mins, 1 hour, 24 hours), with the rows
+of each account kept contiguous. Sums, means and per-state breakdowns are
+then computed for every account at once; for the percentiles each account's
+block is sorted in place of the array and the ranks of all the accounts are
+read at once. Without NumPy the same numbers are computed in plain Python.
+"""
+from itertools import chain
+from operator import attrgetter
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+STATES = ( "ONLINE", "OFFLINE", "DEAD", "UNKNOWN" )
+STATE_CODES = { "ONLINE": 0, "OFFLINE": 1, "DEAD": 2, "": 3 }
+
+PERCENTILES = ( 5, 50, 95 )
+
+# below this many workers the fixed cost of the NumPy calls outweighs the
+# per-worker gain, and the plain Python engine is faster (bench_statistics.py)
+NUMPY_MIN_WORKERS = 500
+
+_rates = attrgetter("hrate10m", "hrate1h", "hrate24h")
+_state = attrgetter("state")
+
+
+class _StateCodes(dict):
+    def __missing__(self, state):
+        return STATE_CODES[""]
+
+
+_state_codes = _StateCodes(STATE_CODES)
+
+
+def account_statistics(groups: Dict[str, List]) -> Dict[str, Dict]:
+    """Statistics of every account's SBICryptoWorker records.
+
+    For each account with workers returns the sum, mean, median, p5 and p95
+    of the three hashrate windows, and the worker count and hashrate sum per
+    state; all plain Python numbers, so the result can be persisted as JSON.
+    """
+    groups = { name: workers for name, workers in groups.items() if workers }
+    if not groups:
+        return {}
+
+    if np is None or sum(map(len, groups.values())) < NUMPY_MIN_WORKERS:
+        return { name: _python_statistics(workers) for name, workers in groups.items() }
+
+    return _numpy_statistics(groups)
+
+
+def _numpy_statistics(groups: Dict[str, List]) -> Dict[str, Dict]:
+    names = list(groups)
+    sizes = np.fromiter((len(groups[name]) for name in names), dtype=np.int64, count=len(names))
+    total = int(sizes.sum())
+    starts = np.concatenate(([ 0 ], np.cumsum(sizes)[:-1]))
+
+    workers = list(chain.from_iterable(groups[name] for name in names))
+    # map and attrgetter keep the per-worker work out of the interpreter loop
+    rates = np.fromiter(chain.from_iterable(map(_rates, workers)), dtype=np.float64, count=total * 3).reshape(total, 3)
+    states = np.fromiter(map(_state_codes.__getitem__, map(_state, workers)), dtype=np.int64, count=total)
+    group = np.repeat(np.arange(len(names)), sizes)
+
+    sums = np.add.reduceat(rates, starts, axis=0)
+    means = sums / sizes[:, None]
+
+    # per (account, state) cell, counts and sums of each window
+    cells = group * len(STATES) + states
+    state_counts = np.bincount(cells, minlength=len(names) * len(STATES)).reshape(len(names), len(STATES))
+    state_sums = np.stack([
+        np.bincount(cells, weights=rates[:, window], minlength=len(names) * len(STATES))
+        for window in range(3)
+    ], axis=-1).reshape(len(names), len(STATES), 3)
+
+    # linear interpolation between the closest ranks, like numpy.percentile
+    ordered = np.empty_like(rates)
+    for start, end in zip(starts.tolist(), (starts + sizes).tolist()):
+        ordered[start:end] = np.sort(rates[start:end], axis=0)
+    percentiles = []
+    for q in PERCENTILES:
+        position = (sizes - 1) * q / 100
+        lower = position.astype(np.int64)
+        upper = np.minimum(lower + 1, sizes - 1)
+        low, high = ordered[starts + lower], ordered[starts + upper]
+        percentiles.append((low + (high - low) * (position - lower)[:, None]).tolist())
+    p5, median, p95 = percentiles
+
+    # one conversion per array, not per account
+    sums, means, state_counts, state_sums = sums.tolist(), means.tolist(), state_counts.tolist(), state_sums.tolist()
+
+    result = {}
+    for i, name in enumerate(names):
+        result[name] = {
+            "sum": sums[i],
+            "mean": means[i],
+            "median": median[i],
+            "p5": p5[i],
+            "p95": p95[i],
+            "states": {
+                state: { "count": state_counts[i][j], "sum": state_sums[i][j] }
+                for j, state in enumerate(STATES)
+            },
+        }
+
+    return result
+
+
+def _percentile(values: List[float], q: float) -> float:
+    """Linear interpolation between the closest ranks, like numpy.percentile."""
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def _python_statistics(workers: List) -> Dict:
+    count = len(workers)
+    columns = [
+        sorted(float(worker.hrate10m) for worker in workers),
+        sorted(float(worker.hrate1h) for worker in workers),
+        sorted(float(worker.hrate24h) for worker in workers),
+    ]
+    states = { state: { "count": 0, "sum": [ 0.0, 0.0, 0.0 ] } for state in STATES }
+
+    for worker in workers:
+        cell = states[STATES[STATE_CODES.get(worker.state, 3)]]
+        cell["count"] += 1
+        cell["sum"][0] += worker.hrate10m
+        cell["sum"][1] += worker.hrate1h
+        cell["sum"][2] += worker.hrate24h
+
+    sums = [ float(sum(column)) for column in columns ]
+
+    return {
+        "sum": sums,
+        "mean": [ value / count for value in sums ],
+        "median": [ _percentile(column, 50) for column in columns ],
+        "p5": [ _percentile(column, 5) for column in columns ],
+        "p95": [ _percentile(column, 95) for column in columns ],
+        "states": states,
+    }
@@ -0,0 +1,121 @@
+"""
+Incremental JSON reader for large API responses
+"""
+import codecs
+import json
+from typing import Any, AsyncIterator, Optional
+
+_WHITESPACE = " \t\n\r"
+# characters that may continue a number
+_NUMBER = "0123456789+-.eE"
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer:
+    """Text buffer filled from an async iterator of byte chunks."""
+
+    def __init__(self, chunks: AsyncIterator[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    async def fill(self) -> bool:
+        """Read one more chunk. Returns False once the input is exhausted."""
+        if self.eof:
+            return False
+
+        # drop what was consumed already, so the buffer only ever holds
+        # the value being decoded plus one chunk
+        self.text = self.text[self.pos:]
+        self.pos = 0
+
+        try:
+            chunk = await self._chunks.__anext__()
+        except StopAsyncIteration:
+            self.text += self._decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+
+        self.text += self._decoder.decode(chunk)
+        return True
+
+    async def peek(self) -> Optional[str]:
+        """Skip whitespace and return the next character, None at the end of input."""
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not await self.fill():
+                return None
+
+    async def expect(self, chars: str) -> str:
+        char = await self.peek()
+        if char is None or char not in chars:
+            raise ValueError(f"Expected one of {chars!r} at offset {self.pos}, got {char!r}")
+        self.pos += 1
+        return char
+
+    async def value(self) -> Any:
+        """Decode the next complete JSON value."""
+        await self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if not await self.fill():
+                    raise
+                continue
+
+            # a number is only complete once a delimiter follows it: at the end
+            # of the buffer, or cut right after its "." or "e", it may go on in
+            # the next chunk
+            if not self.eof and (end == len(self.text) or self.text[end] in _NUMBER) and await self.fill():
+                continue
+
+            self.pos = end
+            return value
+
+
+async def iter_json_items(chunks: AsyncIterator[bytes], key: str = "content") -> AsyncIterator[Any]:
+    """Yield the items of a JSON array one by one while the body is still arriving.
+
+    The array is either the whole document or the value of `key` in the
+    top level object. Only one item is decoded and held at a time, the rest
+    of the document is skipped value by value.
+    """
+    buffer = _Buffer(chunks)
+
+    first = await buffer.expect("[{")
+
+    if first == "{":
+        if await buffer.peek() == "}":
+            return
+
+        while True:
+            name = await buffer.value()
+            await buffer.expect(":")
+
+            if name == key and await buffer.peek() == "[":
+                await buffer.expect("[")
+                break
+
+            value = await buffer.value()
+            if name == key and isinstance(value, list):
+                for item in value:
+                    yield item
+
+            if await buffer.expect(",}") == "}":
+                return
+
+    if await buffer.peek() == "]":
+        return
+
+    while True:
+        yield await buffer.value()
+
+        if await buffer.expect(",]") == "]":
+            return
@@ -0,0 +1,24 @@
+"""
+HTTP endpoint with the refresh metrics in the Prometheus text format
+"""
+from aiohttp import web
+
+from homeassistant.components.http import HomeAssistantView
+
+from .metrics import Metrics
+
+
+class SBICryptoMetricsView(HomeAssistantView):
+    """Serves the refresh metrics for a Prometheus scrape (authenticated like the rest of the API)."""
+
+    url = "/api/sbicrypto_pool/metrics"
+    name = "api:sbicrypto_pool:metrics"
+
+    def __init__(self, metrics: Metrics):
+        self._metrics = metrics
+
+    async def get(self, request):
+        return web.Response(
+            body=self._metrics.render().encode("utf-8"),
+            headers={ "Content-Type": "text/plain; version=0.0.4; charset=utf-8" }
+        )
@@ -0,0 +1,62 @@
+"""
+Chunk boundary fuzz test of the incremental JSON reader
+
+    python -m pytest tests
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from custom_components.sbicrypto_pool.stream import iter_json_items
+
+DOCUMENTS = [
+    { "content": [ 1.5, 2, -3.25e-2, 1e10, 0, -0.0, 12345678901234567890, True, None, "x", { "a": [ 1.5, { "b": -2E+3 } ] } ] },
+    { "meta": 1.25, "other": [ 3.5e1, "y" ], "content": [ { "hashrates": [ 10.5, 20.25, 30.125 ] }, 7.75 ], "tail": -1.5 },
+    [ 1.5, 2.75, -0.5e-3 ],
+    { "content": 42.5 },
+]
+
+
+def items(document):
+    if isinstance(document, list):
+        return document
+    content = document.get("content")
+    return content if isinstance(content, list) else []
+
+
+def read(data: bytes, cuts):
+    async def chunks():
+        last = 0
+        for cut in cuts:
+            yield data[last:cut]
+            last = cut
+        yield data[last:]
+
+    async def collect():
+        return [ item async for item in iter_json_items(chunks()) ]
+
+    return asyncio.run(collect())
+
+
+def test_every_cut():
+    for document in DOCUMENTS:
+        data = json.dumps(document).encode()
+        for cut in range(len(data) + 1):
+            assert read(data, [ cut ]) == items(document), (data[:cut], data[cut:])
+
+
+def test_random_chunks():
+    rnd = random.Random(0)
+    for document in DOCUMENTS:
+        data = json.dumps(document, separators=(",", ":")).encode()
+        for _ in range(200):
+            cuts = sorted(rnd.sample(range(len(data) + 1), rnd.randint(1, 12)))
+            assert read(data, cuts) == items(document)
+
+
+def test_number_cut_after_the_point():
+    assert read(b'{"content": [1.5, 2]}', [ len(b'{"content": [1.') ]) == [ 1.5, 2 ]